@@ -1,7 +1,11 @@
 import os
+import multiprocessing
 from app import create_app
 
-app = create_app()
+# 提取进程池的工作进程（spawn方式启动时会重新导入主模块）不创建应用，
+# 避免在每个工作进程中初始化研究服务、存储节点及其后台线程
+if multiprocessing.current_process().name == 'MainProcess':
+    app = create_app()
 
 if __name__ == '__main__':
     # 使用端口8000，避免与系统其他服务冲突
@@ -1,3 +1,5 @@
+import os
+import multiprocessing
 from flask import Flask, jsonify
 from flask_cors import CORS
 
@@ -10,6 +12,13 @@ def create_app():
     app.register_blueprint(chat_routes.bp)
     app.register_blueprint(research_routes.bp)
     
+    # 启动时从检查点恢复被中断的研究过程，并定期恢复执行节点已停止的过程（需配合sqlite存储使用）
+    # 提取进程池的工作进程（spawn方式启动时会重新导入主模块）不执行恢复；
+    # 重新导入主模块时parent_process()尚未设置，按进程名判断
+    if (os.environ.get('RESEARCH_RESUME_ON_STARTUP', 'false').lower() == 'true'
+            and multiprocessing.current_process().name == 'MainProcess'):
+        research_routes.research_service.start_auto_resume()
+    
     # 添加API状态检查端点
     @app.route('/api/status', methods=['GET'])
     def check_status():
@@ -1,5 +1,6 @@
-from flask import Blueprint, request, jsonify
-from app.services.research_service import research_service
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from app.services.research_service import research_service, FINISHED_STATUSES
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -39,7 +40,11 @@ def start_research():
 
 @bp.route('/status/<process_id>', methods=['GET'])
 def get_research_status(process_id):
-    """获取研究过程的状态"""
+    """获取研究过程的状态
+    
+    支持If-None-Match（状态未变化时返回304），以及since=<version>只返回该版本之后变化的字段和步骤；
+    wait=<秒>&version=<N>时挂起请求，直到状态版本超过N或超时（长轮询）
+    """
     logger.debug(f"\u83b7取研究状态: {process_id}")
     
     process = research_service.get_research_process(process_id)
@@ -47,7 +52,25 @@ def get_research_status(process_id):
         logger.warning(f"\u672a找到研究过程: {process_id}")
         return jsonify({"error": "未找到指定的研究过程"}), 404
     
-    result = process.to_dict()
+    wait = request.args.get('wait', type=float)
+    version = request.args.get('version', type=int)
+    if wait and version is not None:
+        process = research_service.wait_for_version(process, version, wait)
+    
+    # 调度队列信息：排队位置和预计开始时间
+    queue_info = research_service.get_queue_info(process_id)
+    etag = process.get_etag(queue_info)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    since = request.args.get('since', type=int)
+    if since is not None and since <= process.version:
+        result = process.to_delta(since)
+    else:
+        result = process.to_dict()
+    result["queue"] = queue_info
     # 记录关键状态变化
     logger.debug(f"\u7814究过程状态: {result['status']}, \u8fdb度: {result['progress']}%")
     
@@ -55,9 +78,67 @@ def get_research_status(process_id):
     if result['status'] == 'waiting_confirmation':
         logger.info(f"\u7814究计划已生成并等待确认: {process_id}")
         has_plan = bool(result.get('plan'))
-        logger.info(f"\u8ba1划存在: {has_plan}, \u8ba1划长度: {len(result.get('plan', ''))}")
+        logger.info(f"\u8ba1划存在: {has_plan}, \u8ba1划长度: {len(result.get('plan') or '')}")
     
-    return jsonify(result)
+    response = jsonify(result)
+    response.set_etag(etag)
+    return response
+
+def _format_sse(event_type, data, event_id=None):
+    """格式化一条Server-Sent Events消息"""
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+@bp.route('/stream/<process_id>', methods=['GET'])
+def stream_research_events(process_id):
+    """以Server-Sent Events推送研究进度事件
+    
+    断线重连时浏览器通过Last-Event-ID请求头（或last_event_id参数）续传；
+    所需事件已被淘汰时先发送reset事件，客户端应通过/status重新获取完整状态。
+    """
+    process = research_service.get_research_process(process_id)
+    if not process:
+        return jsonify({"error": "未找到指定的研究过程"}), 404
+    
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_event_id', 0, type=int)
+    logger.info(f"\u8ba2阅研究进度事件: {process_id}, Last-Event-ID: {last_id}")
+    
+    def generate():
+        nonlocal last_id
+        while True:
+            # 先读取状态再取事件：已结束的研究过程不会再产生事件，发送完剩余事件后立即关闭
+            finished = research_service.store.get_status(process_id) in FINISHED_STATUSES
+            timeout = 0 if finished else research_service.stream_keepalive
+            events, truncated = research_service.wait_for_events(process, last_id, timeout)
+            if truncated:
+                yield _format_sse("reset", {"version": process.version})
+            for event in events:
+                yield _format_sse(event["type"], dict(event["data"], time=event["time"]), event["id"])
+                last_id = event["id"]
+            if finished:
+                return
+            if events:
+                continue
+            yield ": keep-alive\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 禁止nginx缓冲事件流
+    })
+
+@bp.route('/scheduler', methods=['GET'])
+def get_scheduler_status():
+    """获取全局研究任务调度器的运行状态"""
+    return jsonify(research_service.get_scheduler_stats())
+
+@bp.route('/cache', methods=['GET'])
+def get_cache_status():
+    """获取搜索服务各级缓存的命中统计"""
+    return jsonify(research_service.get_cache_stats())
 
 @bp.route('/confirm/<process_id>', methods=['POST'])
 def confirm_research_plan(process_id):
@@ -91,15 +172,29 @@ def confirm_research_plan(process_id):
 @bp.route('/cancel/<process_id>', methods=['POST'])
 def cancel_research(process_id):
     """取消研究过程"""
-    process = research_service.get_research_process(process_id)
+    # 移除排队中的任务并中断正在执行的搜索、抓取和LLM请求
+    process = research_service.cancel_research(process_id)
     if not process:
         return jsonify({"error": "未找到指定的研究过程"}), 404
     
-    # 将状态设置为取消
-    process.status = "cancelled"
-    process.current_step = "研究已取消"
-    
     return jsonify({
         "message": "研究已取消",
+        "process_id": process_id,
+        "skipped": process.get_cancellation_report()
+    })
+
+@bp.route('/resume/<process_id>', methods=['POST'])
+def resume_research(process_id):
+    """从检查点恢复中断的研究过程"""
+    logger.info(f"\u63a5收恢复研究请求: {process_id}")
+    
+    success, message = research_service.resume_research(process_id)
+    if not success:
+        logger.warning(f"\u65e0法恢复研究过程 {process_id}: {message}")
+        status_code = 404 if message == "未找到指定的研究过程" else 400
+        return jsonify({"error": message}), status_code
+    
+    return jsonify({
+        "message": message,
         "process_id": process_id
     })
@@ -0,0 +1,151 @@
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 当前线程正在为哪个研究过程工作
+_local = threading.local()
+
+class ResearchCancelled(Exception):
+    """研究过程已被取消"""
+
+class CancellationToken:
+    """研究过程的取消令牌
+
+    执行流水线在阶段之间和阶段内部检查令牌；取消时会立即关闭该研究过程正在使用的
+    HTTP连接（SiliconFlow和目标网站），使阻塞中的请求马上返回，并统计被跳过的工作量。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._connections = set()
+        self.skipped = {}
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """取消研究过程：中断进行中的请求并执行已注册的回调"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+            connections = list(self._connections)
+
+        aborted = 0
+        for conn in connections:
+            sock = getattr(conn, "sock", None)
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+                aborted += 1
+            except OSError:
+                pass
+        if aborted:
+            self.record_skip("aborted_requests", aborted)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"执行取消回调时出错: {str(e)}")
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise ResearchCancelled()
+
+    def wait(self, timeout):
+        """可被取消打断的等待，返回True表示已取消"""
+        return self._event.wait(timeout)
+
+    def on_cancel(self, callback):
+        """注册取消回调，已取消时立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def record_skip(self, kind, count=1):
+        """记录因取消而跳过的工作"""
+        with self._lock:
+            self.skipped[kind] = self.skipped.get(kind, 0) + count
+
+    def report(self):
+        with self._lock:
+            return dict(self.skipped)
+
+    @contextmanager
+    def activate(self):
+        """在当前线程内关联该令牌，期间发出的HTTP请求可被取消中断"""
+        previous = getattr(_local, "token", None)
+        _local.token = self
+        try:
+            yield self
+        finally:
+            _local.token = previous
+
+    def _track(self, conn):
+        with self._lock:
+            self._connections.add(conn)
+            cancelled = self._event.is_set()
+        if cancelled and getattr(conn, "sock", None) is not None:
+            conn.sock.shutdown(socket.SHUT_RDWR)
+
+    def _untrack(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+
+def current_token():
+    """获取当前线程关联的取消令牌，没有时返回None"""
+    return getattr(_local, "token", None)
+
+def check_cancelled():
+    """当前线程关联的研究过程已取消时抛出ResearchCancelled"""
+    token = current_token()
+    if token is not None:
+        token.raise_if_cancelled()
+
+class _TrackedConnectionPoolMixin:
+    """连接取出时登记到当前线程的取消令牌，归还时注销"""
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        token = current_token()
+        if token is not None:
+            conn._cancel_token = token
+            token._track(conn)
+        return conn
+
+    def _put_conn(self, conn):
+        token = getattr(conn, "_cancel_token", None)
+        if token is not None:
+            token._untrack(conn)
+            conn._cancel_token = None
+        super()._put_conn(conn)
+
+class _TrackedHTTPConnectionPool(_TrackedConnectionPoolMixin, HTTPConnectionPool):
+    pass
+
+class _TrackedHTTPSConnectionPool(_TrackedConnectionPoolMixin, HTTPSConnectionPool):
+    pass
+
+class CancellableHTTPAdapter(HTTPAdapter):
+    """支持按研究过程中断进行中请求的HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TrackedHTTPConnectionPool,
+            "https": _TrackedHTTPSConnectionPool,
+        }
@@ -0,0 +1,99 @@
+import re
+import codecs
+
+# 检查<meta>编码声明的字节数
+META_SCAN_BYTES = 4096
+
+# 统计探测最多检查的字节数
+PROBE_BYTES = 16 * 1024
+
+# 未声明编码时依次尝试的编码，排在前面的优先
+PROBE_ENCODINGS = ['utf-8', 'gb18030', 'big5']
+
+# 按gb18030解码后常用简体字比例低于该值时视为big5
+COMMON_HANZI_RATIO = 0.8
+
+# 字节顺序标记及对应的编码（解码时会去掉BOM）
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# 网页常见的编码声明与实际应使用的编码：声明为gb2312/gbk的网页经常包含超出其范围的字符，
+# latin-1声明的网页实际多为windows-1252
+ENCODING_ALIASES = {
+    'gb2312': 'gb18030',
+    'gbk': 'gb18030',
+    'iso8859-1': 'cp1252',
+    'ascii': 'cp1252',
+}
+
+_HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+def normalize_encoding(name):
+    """把编码声明转换为Python编码名，无法识别时返回None"""
+    if not name:
+        return None
+    try:
+        encoding = codecs.lookup(name.strip()).name
+    except LookupError:
+        return None
+    return ENCODING_ALIASES.get(encoding, encoding)
+
+def sniff_charset(head, content_type=None):
+    """根据响应开头的字节和Content-Type判断网页编码，返回 (编码, 来源)
+
+    依次检查：BOM、HTTP响应头的charset、前几KB中的<meta>编码声明、对开头数据的统计探测。
+    来源为 "bom"、"header"、"meta"、"probe" 之一。
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, "bom"
+
+    match = _HEADER_CHARSET.search(content_type or "")
+    encoding = normalize_encoding(match.group(1)) if match else None
+    if encoding:
+        return encoding, "header"
+
+    match = _META_CHARSET.search(head[:META_SCAN_BYTES])
+    encoding = normalize_encoding(match.group(1).decode("ascii", "ignore")) if match else None
+    if encoding:
+        # 能以字节解析出<meta>的文档不会是UTF-16
+        return ("utf-8" if encoding.startswith("utf-16") else encoding), "meta"
+
+    return probe_encoding(head[:PROBE_BYTES]), "probe"
+
+def probe_encoding(sample):
+    """统计探测：选择解码错误最少的候选编码，错误数相同时按PROBE_ENCODINGS的顺序
+
+    big5编码的字节大多也能按gb18030解码，但得到的多是生僻字；gb18030解码结果中
+    常用简体字（GB2312字符集）比例过低且big5能无错解码时，判定为big5。
+    """
+    errors = {encoding: _count_errors(sample, encoding) for encoding in PROBE_ENCODINGS}
+    if errors['utf-8'] == 0:
+        return 'utf-8'
+    if errors['gb18030'] == 0 and errors['big5'] == 0:
+        return 'big5' if _common_ratio(sample) < COMMON_HANZI_RATIO else 'gb18030'
+    return min(PROBE_ENCODINGS, key=lambda encoding: (errors[encoding], PROBE_ENCODINGS.index(encoding)))
+
+def _count_errors(sample, encoding):
+    # 使用增量解码，样本末尾被截断的多字节字符不计为错误
+    text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample, final=False)
+    return text.count("\ufffd")
+
+def _common_ratio(sample):
+    """按gb18030解码后，汉字中属于GB2312字符集的比例"""
+    text = codecs.getincrementaldecoder('gb18030')(errors="replace").decode(sample, final=False)
+    hanzi = [ch for ch in text if '\u4e00' <= ch <= '\u9fff']
+    if not hanzi:
+        return 1.0
+    common = 0
+    for ch in hanzi:
+        try:
+            ch.encode('gb2312')
+            common += 1
+        except UnicodeEncodeError:
+            pass
+    return common / len(hanzi)
@@ -0,0 +1,158 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 参与打分的句子最短长度
+MIN_SENTENCE_LENGTH = 20
+
+# 重要信息标记
+INFO_MARKERS = ['重要', '特别', '值得注意', '值得关注', '主要', '关键', 'important', 'critical', 'significant']
+
+_PERCENTAGE = re.compile(r'\d+(?:\.\d+)?\s*(?:%|百分之|百分比)')
+_DATE = re.compile(r'\d{4}(?:\s*[年-]\s*\d{1,2}\s*[月日]?)')
+_LIST_OR_TABLE = re.compile(r'\d+\.\s*\w+|\([1-9]\)|[1-9]\)\s*\w+|\u7b2c[\u4e00-\u4e94六七八九十]|\u8868\s*\d+')
+
+def normalize_document(text):
+    """预清理文本，去除多余空格和几个常见的无用文本模式"""
+    text = re.sub(r'\s+', ' ', text)  # 将多个空白字符替换为单个空格
+    text = re.sub(r'(\d+)\s*?[.:]\s*', r'\1. ', text)  # 修复数字列表格式
+    text = re.sub(r'\.(\w)', r'. \1', text)  # 修复句点后缺少空格的问题
+    return text
+
+def data_value_score(sentence_lower):
+    """与查询无关的数据价值得分：百分比、年份日期、数字列表和表格、重要信息标记"""
+    score = len(_PERCENTAGE.findall(sentence_lower)) * 2
+    score += len(_DATE.findall(sentence_lower))
+    if _LIST_OR_TABLE.search(sentence_lower):
+        score += 1
+    if any(marker in sentence_lower for marker in INFO_MARKERS):
+        score += 1
+    return score
+
+class ScoredSentence:
+    """参与打分的句子及其与查询无关的特征"""
+
+    __slots__ = ("text", "lower", "data_score")
+
+    def __init__(self, text):
+        self.text = text
+        self.lower = text.lower()
+        self.data_score = data_value_score(self.lower)
+
+class DocumentAnalysis:
+    """一篇网页正文的预处理结果，与查询无关，可被多个查询复用
+
+    包含预清理后的文本、全部句子，以及去重并过滤过短句子后的待打分句子及其数据价值得分。
+    """
+
+    def __init__(self, text, splitter):
+        self.text = normalize_document(text)
+        self.sentences = splitter.split(self.text)
+        self.candidates = []
+        seen = set()
+        for sentence in self.sentences:
+            # 跳过过短或重复的句子
+            if len(sentence) < MIN_SENTENCE_LENGTH or sentence in seen:
+                continue
+            seen.add(sentence)
+            self.candidates.append(ScoredSentence(sentence))
+
+class DocumentAnalysisCache:
+    """按URL和正文哈希缓存DocumentAnalysis，最近最少使用的条目先被淘汰"""
+
+    def __init__(self, splitter, max_entries=None):
+        self.splitter = splitter
+        self.max_entries = max_entries or int(os.getenv("DOCUMENT_ANALYSIS_CACHE_SIZE", 500))
+        self._entries = OrderedDict()   # (url, 正文哈希) -> DocumentAnalysis
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+
+    def get(self, text, url=None):
+        """获取正文的分析结果，不存在时分析并缓存"""
+        key = (url, hashlib.sha1(text.encode("utf-8")).hexdigest())
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return analysis
+            self._counters["misses"] += 1
+
+        analysis = DocumentAnalysis(text, self.splitter)
+        with self._lock:
+            self._entries[key] = analysis
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return analysis
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries))
+
+def extract_key_information(text, query, documents, matchers, url=None):
+    """从文本中提取与查询相关的关键信息
+
+    documents为DocumentAnalysisCache，matchers为QueryMatcherCache，
+    返回最相关的句子组成的段落，没有有效内容时返回None
+    """
+    # 如果文本为空或过短，直接返回none，避免处理空内容
+    if not text or len(text) < 50:
+        logger.warning(f"提取内容过短或为空: {len(text) if text else 0} 字符")
+        return None
+    
+    # 预清理、分句和与查询无关的句子特征按网页缓存，多个查询共用
+    document = documents.get(text, url)
+    text = document.text
+    sentences = document.sentences
+    
+    # 如果仍然没有句子，返回原始文本的一部分
+    if not sentences and text:
+        return text[:500] + "..." if len(text) > 500 else text
+    elif not sentences:
+        logger.warning("无法提取有效的句子")
+        return None
+    
+    # 同一查询的所有网页共用预先编译的匹配器
+    matcher = matchers.get(query)
+    
+    # 寻找相关句子并打分：关键词得分 + 数据价值得分
+    relevant_sentences = []
+    for candidate in document.candidates:
+        total_score = matcher.keyword_score(candidate.lower) + candidate.data_score * 1.2
+        
+        # 只收集超过阈值的句子
+        if total_score > 0.5:  # 降低阈值增加可能的匹配数量
+            relevant_sentences.append((candidate.text, total_score))
+    
+    # 按相关性排序
+    relevant_sentences.sort(key=lambda x: x[1], reverse=True)
+    
+    # 如果找到了相关句子，只保留句子内容
+    relevant_sentences = [s[0] for s in relevant_sentences]
+    
+    # 如果没有找到相关句子，使用前几个句子
+    if not relevant_sentences and sentences:
+        relevant_sentences = sentences[:5]
+        logger.info("未找到精确匹配，使用首句摘要")
+    
+    # 将相关句子组合成段落
+    if relevant_sentences:
+        # 限制返回的句子数量，避免过多
+        if len(relevant_sentences) > 8:
+            relevant_sentences = relevant_sentences[:8]
+            
+        key_info = " ".join(relevant_sentences)
+        # 限制长度
+        if len(key_info) > 1000:
+            key_info = key_info[:1000] + "..."
+        return key_info
+    else:
+        logger.warning("未找到任何相关信息")
+        return None
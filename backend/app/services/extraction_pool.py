@@ -0,0 +1,160 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from app.services.cancellation import ResearchCancelled, check_cancelled
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 工作进程内的提取状态，首次执行任务时创建
+_worker_state = None
+
+def _get_worker_state():
+    global _worker_state
+    if _worker_state is None:
+        from app.services.html_extractors import get_extractor
+        from app.services.sentence_splitter import get_sentence_splitter
+        from app.services.document_analysis import DocumentAnalysisCache
+        from app.services.query_matcher import QueryMatcherCache
+        from app.services.related_terms import get_related_terms
+        _worker_state = {
+            "extractor": get_extractor(),
+            "documents": DocumentAnalysisCache(get_sentence_splitter()),
+            "matchers": QueryMatcherCache(get_related_terms),
+        }
+    return _worker_state
+
+def _extract_text_task(html_text):
+    """工作进程：从HTML中提取正文"""
+    return _get_worker_state()["extractor"].extract(html_text)
+
+def _key_information_task(text, query, url):
+    """工作进程：从正文中提取与查询相关的关键信息"""
+    from app.services.document_analysis import extract_key_information
+    state = _get_worker_state()
+    return extract_key_information(text, query, state["documents"], state["matchers"], url)
+
+class ExtractionPool:
+    """可选的提取进程池：把HTML解析和关键信息提取放到工作进程中执行
+
+    这两项是纯Python的CPU密集型工作，在主进程中执行会与Flask请求线程和研究线程争用GIL。
+    EXTRACTION_POOL_SIZE为0（默认）时不创建进程池，直接在当前进程中执行；
+    进程池出错、任务超时或工作进程崩溃时，对应任务退回到当前进程执行。
+    """
+
+    def __init__(self, local_key_information, local_extract_text, size=None):
+        self.local_key_information = local_key_information
+        self.local_extract_text = local_extract_text
+        size = size if size is not None else int(os.getenv("EXTRACTION_POOL_SIZE", 0))
+        self.size = max(0, min(size, os.cpu_count() or 1))
+        self.timeout = float(os.getenv("EXTRACTION_POOL_TIMEOUT", 30))
+        # 默认使用spawn启动工作进程，避免在多线程进程中fork
+        self.start_method = os.getenv("EXTRACTION_POOL_START_METHOD", "spawn")
+        self._executor = None
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "completed": 0, "local": 0, "fallbacks": 0, "restarts": 0}
+        if self.size:
+            logger.info(f"启用提取进程池，工作进程数: {self.size}")
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def extract_text(self, html_text):
+        """从HTML中提取正文"""
+        return self.extract_text_batch([html_text])[0]
+
+    def extract_text_batch(self, html_texts):
+        """批量从HTML中提取正文，结果按顺序返回"""
+        return self._map(_extract_text_task, [(html_text,) for html_text in html_texts], self.local_extract_text)
+
+    def extract_key_information_batch(self, items):
+        """批量提取关键信息，items为 [(文本, 查询, url)]，结果按顺序返回"""
+        return self._map(_key_information_task, [tuple(item) for item in items], self.local_key_information)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, size=self.size, running=self._executor is not None)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _map(self, task, args_list, local_fn):
+        if not args_list:
+            return []
+        if not self.enabled:
+            self._count("local", len(args_list))
+            return [local_fn(*args) for args in args_list]
+
+        try:
+            executor = self._get_executor()
+            futures = [executor.submit(task, *args) for args in args_list]
+        except Exception as e:
+            logger.warning(f"提交到提取进程池失败，在当前进程中执行: {str(e)}")
+            self._reset(executor=None)
+            self._count("fallbacks", len(args_list))
+            return [local_fn(*args) for args in args_list]
+        self._count("submitted", len(futures))
+
+        results = []
+        for future, args in zip(futures, args_list):
+            try:
+                results.append(self._wait(future))
+                self._count("completed")
+            except ResearchCancelled:
+                for pending in futures:
+                    pending.cancel()
+                raise
+            except BrokenProcessPool as e:
+                logger.warning(f"提取进程池已损坏，将重新创建: {str(e)}")
+                self._reset(executor)
+                self._count("fallbacks")
+                results.append(local_fn(*args))
+            except FutureTimeoutError:
+                logger.warning(f"提取任务超过 {self.timeout} 秒未完成，在当前进程中执行")
+                future.cancel()
+                self._count("fallbacks")
+                results.append(local_fn(*args))
+            except Exception as e:
+                logger.warning(f"提取任务在工作进程中失败，在当前进程中执行: {str(e)}")
+                self._count("fallbacks")
+                results.append(local_fn(*args))
+        return results
+
+    def _wait(self, future):
+        """等待任务结果，期间研究取消时抛出ResearchCancelled"""
+        waited = 0.0
+        while True:
+            try:
+                return future.result(timeout=0.2)
+            except FutureTimeoutError:
+                check_cancelled()
+                waited += 0.2
+                if waited >= self.timeout:
+                    raise
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size, mp_context=multiprocessing.get_context(self.start_method)
+                )
+            return self._executor
+
+    def _reset(self, executor):
+        """丢弃已损坏的进程池，下次提交时重新创建"""
+        with self._lock:
+            if self._executor is not None and (executor is None or self._executor is executor):
+                self._executor.shutdown(wait=False)
+                self._executor = None
+                self._counters["restarts"] += 1
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
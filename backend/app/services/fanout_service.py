@@ -0,0 +1,43 @@
+import os
+import logging
+import threading
+from app.services.search_service import search_service
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+class FanoutEngine:
+    """并发扇出引擎：限制执行流水线发起的搜索查询和网页抓取的并发
+
+    - 全局并发上限：所有研究过程共享的信号量，限制同时进行的网络请求总数
+    - 步骤并发上限：单个研究步骤同时进行的请求数（由流水线按步骤占用）
+    - 单请求超时：传递给底层HTTP请求
+    """
+
+    def __init__(self, global_limit=None, step_limit=None, search_timeout=None, fetch_timeout=None):
+        self.global_limit = global_limit or int(os.getenv("FANOUT_GLOBAL_CONCURRENCY", 16))
+        self.step_limit = step_limit or int(os.getenv("FANOUT_STEP_CONCURRENCY", 6))
+        self.search_timeout = search_timeout or float(os.getenv("FANOUT_SEARCH_TIMEOUT", 20))
+        self.fetch_timeout = fetch_timeout or float(os.getenv("FANOUT_FETCH_TIMEOUT", 10))
+        self._global_slots = threading.BoundedSemaphore(self.global_limit)
+        logger.info(f"初始化并发扇出引擎，全局并发: {self.global_limit}, 步骤并发: {self.step_limit}")
+
+    def search(self, query, num_results=30):
+        """占用全局并发名额执行单个搜索查询"""
+        return self._call_with_slot(
+            lambda q: search_service.search(q, num_results, timeout=self.search_timeout), query
+        )
+
+    def fetch(self, url):
+        """占用全局并发名额抓取单个网页"""
+        return self._call_with_slot(
+            lambda u: search_service.fetch_content(u, timeout=self.fetch_timeout), url
+        )
+
+    def _call_with_slot(self, fn, item):
+        """占用一个全局并发名额执行请求"""
+        with self._global_slots:
+            return fn(item)
+
+# 创建全局扇出引擎实例
+fanout_engine = FanoutEngine()
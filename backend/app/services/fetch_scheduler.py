@@ -0,0 +1,234 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+from app.services.cancellation import CancellableHTTPAdapter, check_cancelled, current_token
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 表示被限流的响应状态码
+THROTTLE_STATUS_CODES = (429, 503)
+
+class FetchWaitTimeout(Exception):
+    """等待主机并发名额或速率令牌的时间超过了调用者的期限"""
+
+def _retry_after_seconds(value, default, maximum):
+    """解析Retry-After响应头（秒数或HTTP日期），结果不超过maximum秒"""
+    if not value:
+        return min(default, maximum)
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), maximum)
+    try:
+        return min(max(0.0, parsedate_to_datetime(value).timestamp() - time.time()), maximum)
+    except (TypeError, ValueError):
+        return min(default, maximum)
+
+class _HostState:
+    """单个主机的并发名额、令牌桶、连接池和统计"""
+
+    def __init__(self, host, concurrency, rate, burst, headers):
+        self.host = host
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.blocked_until = 0.0   # 被限流后暂停请求到该时间
+        self.lock = threading.Lock()
+        # 每个主机独立的keep-alive连接池，大小与该主机的并发上限一致
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = CancellableHTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.waiting = 0
+        self.active = 0
+        self.requests = 0
+        self.throttled = 0
+        self.gave_up = 0   # 等待超过期限而放弃的请求数
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_used = time.time()
+
+    def reserve(self):
+        """尝试取得一个令牌，返回还需等待的秒数（0表示已取得）"""
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def stats(self):
+        with self.lock:
+            return {
+                "host": self.host,
+                "queued": self.waiting,
+                "active": self.active,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "gave_up": self.gave_up,
+                "avg_wait": round(self.total_wait / self.requests, 3) if self.requests else 0.0,
+                "max_wait": round(self.max_wait, 3),
+                "blocked_for": round(max(0.0, self.blocked_until - time.time()), 1)
+            }
+
+class HostLease:
+    """已取得主机并发名额和速率令牌的一次请求"""
+
+    def __init__(self, scheduler, state):
+        self._scheduler = scheduler
+        self._state = state
+
+    def get(self, url, timeout=10, **kwargs):
+        """通过该主机的连接池发送GET请求，被限流时暂停该主机的后续请求"""
+        response = self._state.session.get(url, timeout=(self._scheduler.connect_timeout, timeout), **kwargs)
+        if response.status_code in THROTTLE_STATUS_CODES:
+            self._scheduler.throttle(self._state, response.headers.get("Retry-After"))
+        return response
+
+class FetchScheduler:
+    """网页抓取调度器：按主机限制并发和请求速率
+
+    - 每个主机同时进行的请求数不超过host_concurrency
+    - 每个主机的请求速率由令牌桶控制（host_rate个/秒，允许host_burst个突发）
+    - 收到429/503时按Retry-After暂停该主机，暂停时间不超过max_retry_after秒
+    - 等待名额和令牌的时间超过调用者给出的max_wait时放弃，抛出FetchWaitTimeout
+    - 每个主机使用独立的keep-alive连接池，长时间未使用的主机被回收
+    """
+
+    def __init__(self, headers=None, host_concurrency=None, host_rate=None, host_burst=None, max_hosts=None):
+        self.host_concurrency = host_concurrency or int(os.getenv("FETCH_HOST_CONCURRENCY", 2))
+        self.host_rate = host_rate or float(os.getenv("FETCH_HOST_RATE", 1.0))
+        self.host_burst = host_burst or int(os.getenv("FETCH_HOST_BURST", 3))
+        self.max_hosts = max_hosts or int(os.getenv("FETCH_MAX_HOSTS", 256))
+        self.connect_timeout = float(os.getenv("FETCH_CONNECT_TIMEOUT", 5))
+        self.throttle_backoff = float(os.getenv("FETCH_THROTTLE_BACKOFF", 10))
+        self.max_retry_after = float(os.getenv("FETCH_MAX_RETRY_AFTER", 60))
+        self.headers = dict(headers or {})   # 各主机连接池共用的默认请求头
+        self._hosts = OrderedDict()   # host -> _HostState，按最近使用排序
+        self._lock = threading.Lock()
+        logger.info(f"初始化网页抓取调度器，单主机并发: {self.host_concurrency}, 单主机速率: {self.host_rate}/秒")
+
+    @contextmanager
+    def lease(self, url, max_wait=None):
+        """等待目标主机的并发名额和速率令牌
+
+        期间研究取消时抛出ResearchCancelled；设置max_wait时，等待超过max_wait秒抛出FetchWaitTimeout
+        """
+        state = self._host_state(urlparse(url).hostname or "")
+        started = time.time()
+        deadline = started + max_wait if max_wait is not None else None
+        with state.lock:
+            state.waiting += 1
+        try:
+            while not state.slots.acquire(timeout=0.2):
+                check_cancelled()
+                self._check_deadline(state, deadline)
+            try:
+                while True:
+                    delay = state.reserve()
+                    if delay <= 0:
+                        break
+                    if deadline is not None and time.time() + delay > deadline:
+                        self._give_up(state)
+                    self._sleep(min(delay, 1.0))
+            except BaseException:
+                state.slots.release()
+                raise
+        finally:
+            with state.lock:
+                state.waiting -= 1
+
+        waited = time.time() - started
+        with state.lock:
+            state.active += 1
+            state.requests += 1
+            state.total_wait += waited
+            state.max_wait = max(state.max_wait, waited)
+        try:
+            yield HostLease(self, state)
+        finally:
+            with state.lock:
+                state.active -= 1
+                state.last_used = time.time()
+            state.slots.release()
+
+    def throttle(self, state, retry_after):
+        """主机返回限流响应：暂停该主机的请求并清空令牌"""
+        pause = _retry_after_seconds(retry_after, self.throttle_backoff, self.max_retry_after)
+        with state.lock:
+            state.throttled += 1
+            state.tokens = 0.0
+            state.blocked_until = max(state.blocked_until, time.time() + pause)
+        logger.warning(f"主机 {state.host} 返回限流响应，暂停 {pause:.1f} 秒")
+
+    def stats(self):
+        """各主机的排队深度和等待时间"""
+        with self._lock:
+            states = list(self._hosts.values())
+        hosts = [state.stats() for state in states]
+        requests_total = sum(h["requests"] for h in hosts)
+        busiest = sorted(hosts, key=lambda h: (h["queued"] + h["active"], h["requests"]), reverse=True)
+        return {
+            "hosts": len(hosts),
+            "queued": sum(h["queued"] for h in hosts),
+            "active": sum(h["active"] for h in hosts),
+            "requests": requests_total,
+            "throttled": sum(h["throttled"] for h in hosts),
+            "gave_up": sum(h["gave_up"] for h in hosts),
+            "avg_wait": round(sum(h["avg_wait"] * h["requests"] for h in hosts) / requests_total, 3) if requests_total else 0.0,
+            "max_wait": max((h["max_wait"] for h in hosts), default=0.0),
+            "busiest_hosts": busiest[:10]
+        }
+
+    def _host_state(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _HostState(
+                    host, self.host_concurrency, self.host_rate, self.host_burst, self.headers
+                )
+                self._evict_idle()
+            self._hosts.move_to_end(host)
+            return state
+
+    def _evict_idle(self):
+        """主机数超过上限时关闭最久未使用且空闲的主机连接池"""
+        for host in list(self._hosts)[:-1]:  # 不回收刚加入的主机
+            if len(self._hosts) <= self.max_hosts:
+                return
+            state = self._hosts[host]
+            if state.waiting == 0 and state.active == 0:
+                del self._hosts[host]
+                state.session.close()
+
+    def _check_deadline(self, state, deadline):
+        if deadline is not None and time.time() >= deadline:
+            self._give_up(state)
+
+    def _give_up(self, state):
+        with state.lock:
+            state.gave_up += 1
+        raise FetchWaitTimeout(f"等待主机 {state.host} 的请求名额超过期限")
+
+    def _sleep(self, seconds):
+        """可被研究取消打断的等待"""
+        token = current_token()
+        if token is not None:
+            token.wait(seconds)
+            check_cancelled()
+        else:
+            time.sleep(seconds)
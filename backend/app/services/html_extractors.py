@@ -0,0 +1,285 @@
+import os
+import logging
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+# lxml为可选依赖，未安装时lxml后端不可用
+try:
+    import lxml.html
+    import lxml.etree
+except ImportError:
+    lxml = None
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 正文最大长度，超出部分截断
+MAX_TEXT_LENGTH = 10000
+
+# 查找文章主体的CSS选择器，按优先级排列
+MAIN_SELECTORS = ["article", "main", ".content", "#content", ".post", ".article"]
+
+# 视为文章主体的元素：标签名、class和id
+MAIN_TAGS = {"article", "main"}
+MAIN_CLASSES = {"content", "post", "article"}
+MAIN_IDS = {"content"}
+
+# 不包含正文的元素
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head"}
+
+# 没有结束标签的元素
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+def finalize_text(text, limit=MAX_TEXT_LENGTH):
+    """截断过长的正文"""
+    if len(text) > limit:
+        return text[:limit] + "..."
+    return text
+
+class StreamingTextExtractor(HTMLParser):
+    """增量正文提取器：边下载边解析，收集到足够正文后即可停止下载
+
+    提取规则与整页解析一致：优先使用文章主体元素（article、main、.content、#content、
+    .post、.article）的文本，其次是所有段落，最后是整页文本。区别在于按文档顺序取第一个
+    主体元素，并在主体元素结束或段落文本达到上限时提前结束。
+    """
+
+    def __init__(self, limit=MAX_TEXT_LENGTH):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.done = False
+        self._skip_depth = 0
+        self._main_tag = None      # 正在收集的主体元素标签名
+        self._main_depth = 0
+        self._main_parts = []
+        self._main_length = 0
+        self._main_closed = False
+        self._in_paragraph = False
+        self._paragraph_parts = []
+        self._paragraphs = []
+        self._paragraph_length = 0
+        self._all_parts = []
+        self._all_length = 0
+
+    def feed_text(self, text):
+        """送入一段已解码的HTML，返回是否已收集到足够的正文"""
+        if not self.done:
+            self.feed(text)
+        return self.done
+
+    def result(self):
+        """结束解析并返回正文"""
+        if not self.done:
+            self.close()
+        self._end_paragraph()
+        if self._main_parts:
+            text = " ".join(self._main_parts)
+        elif self._paragraphs:
+            text = " ".join(self._paragraphs)
+        else:
+            text = " ".join(self._all_parts)
+        return finalize_text(text, self.limit)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if tag in VOID_TAGS:
+            return
+        if tag == "p":
+            # 未闭合的段落遇到新段落时自动结束
+            self._end_paragraph()
+            self._in_paragraph = True
+        if self._main_tag is None and not self._main_closed and self._is_main(tag, attrs):
+            self._main_tag = tag
+            self._main_depth = 1
+        elif tag == self._main_tag:
+            self._main_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        # 自闭合标签不包含文本
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if tag == "p":
+            self._end_paragraph()
+        if tag == self._main_tag:
+            self._main_depth -= 1
+            if self._main_depth == 0:
+                self._main_tag = None
+                self._main_closed = True
+                if self._main_parts:
+                    self.done = True
+
+    def handle_data(self, data):
+        if self._skip_depth or self.done:
+            return
+        text = data.strip()
+        if not text:
+            return
+        if self._all_length < self.limit:
+            self._all_parts.append(text)
+            self._all_length += len(text) + 1
+        if self._main_tag is not None:
+            self._main_parts.append(text)
+            self._main_length += len(text) + 1
+            if self._main_length >= self.limit:
+                self.done = True
+        if self._in_paragraph:
+            self._paragraph_parts.append(text)
+
+    def _is_main(self, tag, attrs):
+        if tag in MAIN_TAGS:
+            return True
+        for name, value in attrs:
+            if name == "class" and value and MAIN_CLASSES.intersection(value.split()):
+                return True
+            if name == "id" and value in MAIN_IDS:
+                return True
+        return False
+
+    def _end_paragraph(self):
+        if not self._in_paragraph:
+            return
+        self._in_paragraph = False
+        if self._paragraph_parts:
+            paragraph = "".join(self._paragraph_parts)
+            self._paragraph_parts = []
+            self._paragraphs.append(paragraph)
+            self._paragraph_length += len(paragraph) + 1
+            # 尚未遇到主体元素时，段落文本足够即可结束
+            if self._paragraph_length >= self.limit and not self._main_parts:
+                self.done = True
+
+class HtmlExtractor:
+    """正文提取后端的基类
+
+    extract(html_text) 从完整的HTML中提取正文；session() 返回增量提取会话，
+    通过feed_text()逐段送入HTML、result()取得正文。不支持增量解析的后端
+    在会话中缓存全部HTML，结束时一次性解析。
+    """
+
+    name = None
+    incremental = False   # 是否能在下载过程中提前结束
+
+    def extract(self, html_text):
+        raise NotImplementedError
+
+    def session(self):
+        return BufferedSession(self.extract)
+
+class BufferedSession:
+    """缓存全部HTML的提取会话，结束时调用extract_fn一次性解析"""
+
+    def __init__(self, extract_fn):
+        self._extract_fn = extract_fn
+        self._parts = []
+
+    def feed_text(self, text):
+        self._parts.append(text)
+        return False
+
+    def result(self):
+        return self._extract_fn("".join(self._parts))
+
+class SoupExtractor(HtmlExtractor):
+    """BeautifulSoup（html.parser）后端：参考实现，依次尝试主体选择器、段落和整页文本"""
+
+    name = "soup"
+
+    def extract(self, html_text):
+        soup = BeautifulSoup(html_text, 'html.parser')
+        
+        # 尝试查找文章主体
+        main_content = ""
+        for tag in MAIN_SELECTORS:
+            content = soup.select(tag)
+            if content:
+                main_content = content[0].get_text(separator=' ', strip=True)
+                break
+        
+        # 如果未找到主要内容，则使用所有段落
+        if not main_content:
+            paragraphs = soup.find_all('p')
+            main_content = ' '.join([p.get_text(strip=True) for p in paragraphs])
+        
+        # 如果依然没有内容，则使用整个页面文本
+        if not main_content:
+            main_content = soup.get_text(separator=' ', strip=True)
+        
+        return finalize_text(main_content)
+
+def _class_xpath(name):
+    return f"//*[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]"
+
+class LxmlExtractor(HtmlExtractor):
+    """lxml后端：规则与参考实现相同，使用libxml2解析和XPath查找"""
+
+    name = "lxml"
+
+    # 与MAIN_SELECTORS一一对应的XPath
+    MAIN_XPATHS = ["//article", "//main", _class_xpath("content"), "//*[@id='content']",
+                   _class_xpath("post"), _class_xpath("article")]
+    # 排除脚本、样式等非正文元素中的文本
+    TEXT_XPATH = ".//text()[not(ancestor::script or ancestor::style or ancestor::template)]"
+
+    def __init__(self):
+        self._parser = lxml.html.HTMLParser(encoding="utf-8")
+
+    def extract(self, html_text):
+        try:
+            # 以字节送入，避免带编码声明的文档被拒绝
+            root = lxml.html.document_fromstring(html_text.encode("utf-8", "replace"), parser=self._parser)
+        except (lxml.etree.ParserError, ValueError):
+            return ""
+        
+        main_content = ""
+        for xpath in self.MAIN_XPATHS:
+            elements = root.xpath(xpath)
+            if elements:
+                main_content = self._text(elements[0], ' ')
+                break
+        
+        if not main_content:
+            main_content = ' '.join(self._text(p, '') for p in root.iter('p'))
+        
+        if not main_content:
+            main_content = self._text(root, ' ')
+        
+        return finalize_text(main_content)
+
+    def _text(self, element, separator):
+        return separator.join(t for t in (s.strip() for s in element.xpath(self.TEXT_XPATH)) if t)
+
+class StreamingExtractor(HtmlExtractor):
+    """html.parser流式后端：边下载边解析，主体元素结束或正文足够时提前结束下载"""
+
+    name = "streaming"
+    incremental = True
+
+    def extract(self, html_text):
+        session = self.session()
+        session.feed_text(html_text)
+        return session.result()
+
+    def session(self):
+        return StreamingTextExtractor()
+
+EXTRACTORS = {cls.name: cls for cls in (SoupExtractor, LxmlExtractor, StreamingExtractor)}
+
+DEFAULT_EXTRACTOR = "streaming"
+
+def available_extractors():
+    """当前环境可用的后端名称"""
+    return [name for name in EXTRACTORS if name != "lxml" or lxml is not None]
+
+def get_extractor(name=None):
+    """按名称（默认读取HTML_EXTRACTOR）创建正文提取后端，不可用时退回流式后端"""
+    name = (name or os.getenv("HTML_EXTRACTOR", DEFAULT_EXTRACTOR)).lower()
+    if name not in available_extractors():
+        logger.warning(f"正文提取后端 {name} 不可用，使用 {DEFAULT_EXTRACTOR}")
+        name = DEFAULT_EXTRACTOR
+    return EXTRACTORS[name]()
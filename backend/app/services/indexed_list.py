@@ -0,0 +1,75 @@
+def _identity(item):
+    return item
+
+class IndexedList(list):
+    """按键索引的有序列表：保持插入顺序，按键判断是否已存在只需常数时间
+
+    仍是list的子类，序列化为JSON时与普通列表相同。键由key函数从元素计算，
+    `in` 和 add 按键而不是按元素整体比较；同一键的多个元素只索引第一个。
+    """
+
+    def __init__(self, items=(), key=None):
+        super().__init__(items)
+        self.key = key or _identity
+        self._positions = {}   # 键 -> 第一个该键元素的位置
+        self._reindex()
+
+    def add(self, item):
+        """键不存在时追加元素，返回 (该键元素的位置, 是否追加)"""
+        key = self.key(item)
+        position = self._positions.get(key)
+        if position is not None:
+            return position, False
+        self._positions[key] = len(self)
+        super().append(item)
+        return len(self) - 1, True
+
+    def position_of(self, item):
+        """与item同键的元素的位置，不存在时返回None"""
+        return self._positions.get(self.key(item))
+
+    def __contains__(self, item):
+        return self.key(item) in self._positions
+
+    def append(self, item):
+        self._positions.setdefault(self.key(item), len(self))
+        super().append(item)
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            super().__setitem__(index, item)
+            self._reindex()
+            return
+        old_key = self.key(self[index])
+        super().__setitem__(index, item)
+        if self.key(item) != old_key:
+            self._reindex()
+
+    def __reduce__(self):
+        return self.__class__, (list(self), self.key)
+
+    def _reindex(self):
+        self._positions = {}
+        for position, item in enumerate(self):
+            self._positions.setdefault(self.key(item), position)
+
+def _reindexing(name):
+    """包装会移动元素位置的list方法，执行后重建索引"""
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._reindex()
+        return self if result is self else result
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ("extend", "insert", "remove", "pop", "clear", "sort", "reverse", "__delitem__", "__iadd__", "__imul__"):
+    setattr(IndexedList, _name, _reindexing(_name))
+
+def site_key(site):
+    """研究网站按URL索引"""
+    return site["url"]
+
+def site_list(sites=()):
+    return IndexedList(sites, key=site_key)
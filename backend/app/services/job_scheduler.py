@@ -0,0 +1,191 @@
+import os
+import time
+import heapq
+import logging
+import threading
+import itertools
+import uuid
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 任务类型
+JOB_PLAN = "plan"          # 生成研究计划
+JOB_EXECUTION = "execute"  # 执行研究
+
+# 默认优先级，数值越小越先执行；生成计划耗时短且用户在等待确认，优先处理
+DEFAULT_PRIORITIES = {JOB_PLAN: 0, JOB_EXECUTION: 1}
+
+# 尚无历史数据时使用的任务耗时估计（秒）
+DEFAULT_DURATIONS = {JOB_PLAN: 30.0, JOB_EXECUTION: 300.0}
+
+# 共享运行槽位已满时重新尝试的间隔（秒）
+SLOT_RETRY_INTERVAL = 1.0
+
+class ResearchJob:
+    """调度队列中的一个研究任务"""
+
+    def __init__(self, job_type, process_id, target, priority, seq):
+        self.job_type = job_type
+        self.process_id = process_id
+        self.target = target
+        self.priority = priority
+        self.seq = seq
+        self.submitted_at = time.time()
+        self.started_at = None
+
+class JobScheduler:
+    """全局研究任务调度器
+
+    所有研究计划生成和研究执行任务都进入同一个优先级队列，
+    由固定数量的工作线程依次取出执行，从而限制单个节点上同时运行的研究数量。
+    关联共享存储后，工作线程取出任务前还需占用存储中的运行槽位，
+    使同一节点上所有gunicorn worker合计的并发研究数不超过上限。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or int(os.getenv("RESEARCH_MAX_CONCURRENT_RUNS", 4))
+        self._pending = []   # 堆: (priority, seq, job)
+        self._running = {}   # process_id -> job
+        self._durations = dict(DEFAULT_DURATIONS)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._run_slots = None   # 共享运行槽位的存储，未关联时只按本进程的线程数限制
+        logger.info(f"初始化研究任务调度器，最大并发研究数: {self.max_workers}")
+
+    def submit(self, job_type, process_id, target, priority=None):
+        """提交任务到队列，返回任务对象"""
+        if priority is None:
+            priority = DEFAULT_PRIORITIES.get(job_type, 1)
+        with self._cond:
+            self._ensure_workers()
+            job = ResearchJob(job_type, process_id, target, priority, next(self._seq))
+            # 同优先级按提交顺序先进先出
+            heapq.heappush(self._pending, (job.priority, job.seq, job))
+            self._cond.notify()
+        logger.info(f"研究任务已加入队列: {job_type} {process_id}, 排队任务数: {len(self._pending)}")
+        return job
+
+    def attach_run_slots(self, store):
+        """通过共享存储限制所有worker合计的并发研究数"""
+        self._run_slots = store
+
+    def cancel(self, process_id):
+        """移除研究过程尚在排队的任务，返回移除的任务数"""
+        with self._cond:
+            remaining = [entry for entry in self._pending if entry[2].process_id != process_id]
+            removed = len(self._pending) - len(remaining)
+            if removed:
+                heapq.heapify(remaining)
+                self._pending = remaining
+        if removed:
+            logger.info(f"已从队列中移除研究过程 {process_id} 的 {removed} 个任务")
+        return removed
+
+    def get_queue_info(self, process_id):
+        """获取研究过程在调度队列中的状态、位置和预计开始时间"""
+        with self._cond:
+            if process_id in self._running:
+                job = self._running[process_id]
+                return {
+                    "state": "running",
+                    "job_type": job.job_type,
+                    "started_at": job.started_at
+                }
+
+            ordered = [job for _, _, job in sorted(self._pending)]
+            for position, job in enumerate(ordered):
+                if job.process_id == process_id:
+                    return {
+                        "state": "queued",
+                        "job_type": job.job_type,
+                        "position": position + 1,
+                        "queue_length": len(ordered),
+                        "estimated_start_seconds": round(self._estimate_start(ordered[:position]), 1)
+                    }
+        return None
+
+    def stats(self):
+        """调度器运行状态，供运维查看"""
+        with self._cond:
+            return {
+                "max_workers": self.max_workers,
+                "running": len(self._running),
+                "queued": len(self._pending),
+                "average_durations": {k: round(v, 1) for k, v in self._durations.items()}
+            }
+
+    def _estimate_start(self, jobs_ahead):
+        """按各类任务的平均耗时模拟排队，估算还需等待的秒数"""
+        now = time.time()
+        free_at = [
+            max(0.0, self._durations[job.job_type] - (now - job.started_at))
+            for job in self._running.values()
+        ]
+        free_at += [0.0] * (self.max_workers - len(free_at))
+        heapq.heapify(free_at)
+        for job in jobs_ahead:
+            start = heapq.heappop(free_at)
+            heapq.heappush(free_at, start + self._durations[job.job_type])
+        return free_at[0]
+
+    def _ensure_workers(self):
+        while len(self._workers) < self.max_workers:
+            thread = threading.Thread(target=self._worker, name=f"research-scheduler-{len(self._workers)}")
+            thread.daemon = True
+            thread.start()
+            self._workers.append(thread)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            slot_id = uuid.uuid4().hex
+            if not self._acquire_slot(slot_id):
+                time.sleep(SLOT_RETRY_INTERVAL)
+                continue
+            with self._cond:
+                # 等待槽位期间任务可能已被其他线程取走或被取消
+                job = heapq.heappop(self._pending)[2] if self._pending else None
+                if job is not None:
+                    job.started_at = time.time()
+                    self._running[job.process_id] = job
+            if job is None:
+                self._release_slot(slot_id)
+                continue
+
+            logger.info(f"开始执行研究任务: {job.job_type} {job.process_id}, 排队 {job.started_at - job.submitted_at:.1f} 秒")
+            try:
+                job.target()
+            except Exception as e:
+                logger.error(f"研究任务执行出错 {job.job_type} {job.process_id}: {str(e)}")
+            finally:
+                self._release_slot(slot_id)
+                duration = time.time() - job.started_at
+                with self._cond:
+                    self._running.pop(job.process_id, None)
+                    # 指数滑动平均，用于估算排队任务的开始时间
+                    self._durations[job.job_type] = 0.8 * self._durations[job.job_type] + 0.2 * duration
+
+    def _acquire_slot(self, slot_id):
+        if self._run_slots is None:
+            return True
+        try:
+            return self._run_slots.acquire_run_slot(slot_id, self.max_workers)
+        except Exception as e:
+            # 存储不可用时不阻塞研究任务，仍受本进程线程数限制
+            logger.error(f"占用共享运行槽位失败: {str(e)}")
+            return True
+
+    def _release_slot(self, slot_id):
+        if self._run_slots is None:
+            return
+        try:
+            self._run_slots.release_run_slot(slot_id)
+        except Exception as e:
+            logger.error(f"释放共享运行槽位失败: {str(e)}")
+
+# 创建全局调度器实例
+job_scheduler = JobScheduler()
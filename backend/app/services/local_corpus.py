@@ -0,0 +1,217 @@
+import os
+import re
+import math
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from urllib.parse import urlparse
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'[a-z0-9]+|[一-鿿]+')
+_CJK = re.compile(r'[一-鿿]')
+
+# FTS5 bm25()使用的词频饱和参数
+_BM25_K1 = 1.2
+
+def tokenize(text):
+    """分词：英文和数字按单词，中文按相邻两字（单字成段时保留单字）"""
+    tokens = []
+    for run in _WORD.findall(text.lower()):
+        if _CJK.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+class LocalCorpus:
+    """本地网页语料库：抓取过的网页正文保存在SQLite FTS5全文倒排索引中，按BM25排序检索
+
+    - 中文按二元组、英文按单词预先分词后写入索引
+    - FTS5以段（segment）组织倒排索引，新写入的文档形成小段，由automerge在写入时
+      增量合并，并且每写入merge_every篇文档执行一次有限工作量的合并
+    - 查询时只使用抓取时间在max_age以内的文档；至少min_results篇文档既覆盖大部分查询词、
+      归一化BM25得分又不低于min_score时，搜索服务直接使用本地结果，不再请求外部搜索引擎和重新抓取网页
+    - 归一化得分为BM25得分除以其上限（各查询词的IDF之和乘以k1+1），在0到1之间，
+      只顺带提到查询词的长网页得分很低
+    """
+
+    def __init__(self, path=None):
+        self.enabled = os.getenv("LOCAL_CORPUS_ENABLED", "false").lower() == "true"
+        self.path = path or os.getenv("LOCAL_CORPUS_PATH", "local_corpus.db")
+        self.max_age = float(os.getenv("LOCAL_CORPUS_MAX_AGE", 7 * 24 * 3600))
+        self.max_documents = int(os.getenv("LOCAL_CORPUS_MAX_DOCS", 20000))
+        # 直接使用本地结果所需的文档数，以及每篇文档至少包含的查询词比例和归一化BM25得分
+        self.min_results = int(os.getenv("LOCAL_CORPUS_MIN_RESULTS", 3))
+        self.min_coverage = float(os.getenv("LOCAL_CORPUS_MIN_COVERAGE", 0.8))
+        self.min_score = float(os.getenv("LOCAL_CORPUS_MIN_SCORE", 0.55))
+        self.automerge = int(os.getenv("LOCAL_CORPUS_AUTOMERGE", 4))
+        self.merge_every = int(os.getenv("LOCAL_CORPUS_MERGE_EVERY", 50))
+        self._lock = threading.Lock()
+        self._counters = {"added": 0, "unchanged": 0, "queries": 0, "served": 0, "insufficient": 0, "evicted": 0}
+        self._writes = 0
+        self._conn = None
+        if not self.enabled:
+            return
+        try:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS corpus_documents "
+                    "(id INTEGER PRIMARY KEY, url TEXT UNIQUE, title TEXT, content TEXT, "
+                    "content_hash TEXT, fetched_at REAL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS corpus_documents_fetched ON corpus_documents (fetched_at)")
+                self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS corpus_index USING fts5(tokens)")
+                self._conn.execute("INSERT INTO corpus_index (corpus_index, rank) VALUES ('automerge', ?)", (self.automerge,))
+            count = self._conn.execute("SELECT COUNT(*) FROM corpus_documents").fetchone()[0]
+            logger.info(f"初始化本地语料库: {self.path}, 文档数: {count}")
+        except Exception as e:
+            logger.warning(f"无法打开本地语料库 {self.path}（需要SQLite FTS5支持），本地语料库已关闭: {str(e)}")
+            self._conn = None
+
+    @property
+    def available(self):
+        return self._conn is not None
+
+    def add(self, url, content, title=None):
+        """保存抓取到的网页正文，同一URL的旧版本被替换"""
+        if self._conn is None or not content:
+            return
+        content_hash = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        tokens = " ".join(tokenize(content))
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT id, content_hash FROM corpus_documents WHERE url = ?", (url,)
+                ).fetchone()
+                with self._conn:
+                    if row is not None and row[1] == content_hash:
+                        # 正文未变化，只刷新抓取时间
+                        self._conn.execute(
+                            "UPDATE corpus_documents SET fetched_at = ?, title = COALESCE(?, title) WHERE id = ?",
+                            (now, title, row[0])
+                        )
+                        self._counters["unchanged"] += 1
+                        return
+                    if row is not None:
+                        self._conn.execute("DELETE FROM corpus_index WHERE rowid = ?", (row[0],))
+                        self._conn.execute("DELETE FROM corpus_documents WHERE id = ?", (row[0],))
+                    cursor = self._conn.execute(
+                        "INSERT INTO corpus_documents (url, title, content, content_hash, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                        (url, title, content, content_hash, now)
+                    )
+                    self._conn.execute("INSERT INTO corpus_index (rowid, tokens) VALUES (?, ?)", (cursor.lastrowid, tokens))
+                self._counters["added"] += 1
+                self._writes += 1
+                if self._writes % self.merge_every == 0:
+                    self._merge_step()
+                    self._evict()
+            except Exception as e:
+                logger.warning(f"写入本地语料库失败: {str(e)}")
+
+    def search(self, query, num_results=10):
+        """检索本地语料库，返回 (结果列表, 是否足以代替外部搜索)
+
+        结果格式与搜索引擎结果相同，另外带有content（网页正文）和score（归一化BM25得分），
+        只返回覆盖率和得分都达到阈值的文档
+        """
+        if self._conn is None:
+            return [], False
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return [], False
+        match = " OR ".join('"' + token + '"' for token in query_tokens)
+        with self._lock:
+            self._counters["queries"] += 1
+            try:
+                rows = self._conn.execute(
+                    "SELECT d.url, d.title, d.content, i.tokens, bm25(corpus_index) AS score "
+                    "FROM corpus_index i JOIN corpus_documents d ON d.id = i.rowid "
+                    "WHERE corpus_index MATCH ? AND d.fetched_at > ? ORDER BY score LIMIT ?",
+                    (match, time.time() - self.max_age, max(num_results, self.min_results) * 2)
+                ).fetchall()
+                max_score = self._max_score(query_tokens)
+            except Exception as e:
+                logger.warning(f"检索本地语料库失败: {str(e)}")
+                return [], False
+
+        results = []
+        for url, title, content, tokens, score in rows:
+            document_tokens = set(tokens.split())
+            coverage = sum(1 for token in query_tokens if token in document_tokens) / len(query_tokens)
+            normalized = -score / max_score if max_score > 0 else 0.0
+            if coverage < self.min_coverage or normalized < self.min_score:
+                continue
+            results.append({
+                "title": title or urlparse(url).netloc,
+                "link": url,
+                "snippet": self._snippet(content, query_tokens),
+                "content": content,
+                "score": round(normalized, 3),
+                "provider": "local"
+            })
+            if len(results) >= num_results:
+                break
+
+        sufficient = len(results) >= self.min_results
+        with self._lock:
+            self._counters["served" if sufficient else "insufficient"] += 1
+        return results, sufficient
+
+    def stats(self):
+        with self._lock:
+            documents = 0
+            if self._conn is not None:
+                try:
+                    documents = self._conn.execute("SELECT COUNT(*) FROM corpus_documents").fetchone()[0]
+                except Exception:
+                    pass
+            return dict(self._counters, documents=documents, enabled=self._conn is not None)
+
+    def _max_score(self, query_tokens):
+        """查询的BM25得分上限：按FTS5的公式计算各查询词的IDF，求和后乘以k1+1"""
+        total = self._conn.execute("SELECT COUNT(*) FROM corpus_index").fetchone()[0]
+        idf_sum = 0.0
+        for token in query_tokens:
+            containing = self._conn.execute(
+                "SELECT COUNT(*) FROM corpus_index WHERE corpus_index MATCH ?", ('"' + token + '"',)
+            ).fetchone()[0]
+            idf = math.log((total - containing + 0.5) / (containing + 0.5))
+            idf_sum += idf if idf > 0 else 1e-6   # 与FTS5相同，过于常见的词IDF取一个很小的正数
+        return idf_sum * (_BM25_K1 + 1)
+
+    def _snippet(self, content, query_tokens, width=160):
+        """取第一个查询词附近的一段正文作为摘要"""
+        lower = content.lower()
+        positions = [pos for pos in (lower.find(token) for token in query_tokens) if pos >= 0]
+        start = max(0, min(positions) - width // 4) if positions else 0
+        snippet = content[start:start + width].strip()
+        return ("..." if start else "") + snippet + ("..." if start + width < len(content) else "")
+
+    def _merge_step(self):
+        """执行一次有限工作量的增量段合并"""
+        with self._conn:
+            self._conn.execute("INSERT INTO corpus_index (corpus_index, rank) VALUES ('merge', 500)")
+
+    def _evict(self):
+        """文档数超过上限时删除抓取时间最早的文档"""
+        count = self._conn.execute("SELECT COUNT(*) FROM corpus_documents").fetchone()[0]
+        excess = count - self.max_documents
+        if excess <= 0:
+            return
+        ids = [row[0] for row in self._conn.execute(
+            "SELECT id FROM corpus_documents ORDER BY fetched_at LIMIT ?", (excess,)
+        )]
+        with self._conn:
+            self._conn.executemany("DELETE FROM corpus_index WHERE rowid = ?", [(i,) for i in ids])
+            self._conn.executemany("DELETE FROM corpus_documents WHERE id = ?", [(i,) for i in ids])
+        self._counters["evicted"] += len(ids)
@@ -0,0 +1,171 @@
+import os
+import re
+import zlib
+import random
+import logging
+import threading
+from app.services.indexed_list import IndexedList
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# MinHash使用的大素数（2^61-1）
+_PRIME = (1 << 61) - 1
+
+# 提取阶段生成的发现格式为“根据{来源}({域名})的数据，{关键信息}”，合并后的来源以“、”分隔
+_ATTRIBUTION = re.compile(r'^根据(.+?)的数据，', re.S)
+_SOURCE_SEPARATOR = "、"
+_NON_WORD = re.compile(r'[\W_]+')
+
+def split_attribution(finding):
+    """拆分发现的来源前缀，返回 (来源列表, 正文)；没有来源前缀时来源列表为空"""
+    match = _ATTRIBUTION.match(finding)
+    if not match:
+        return [], finding
+    return match.group(1).split(_SOURCE_SEPARATOR), finding[match.end():]
+
+def merge_findings(existing, duplicate):
+    """把重复发现的来源合并到已有发现中，正文保留已有发现的"""
+    sources, body = split_attribution(existing)
+    duplicate_sources, _ = split_attribution(duplicate)
+    if not sources:
+        return existing
+    new_sources = [source for source in duplicate_sources if source not in sources]
+    if not new_sources:
+        return existing
+    return f"根据{_SOURCE_SEPARATOR.join(sources + new_sources)}的数据，{body}"
+
+def finding_key(finding):
+    """发现按去掉来源前缀后的正文索引，不同来源的相同正文视为同一发现"""
+    return split_attribution(finding)[1]
+
+def finding_list(findings=()):
+    return IndexedList(findings, key=finding_key)
+
+class NearDuplicateIndex:
+    """基于MinHash和LSH分段的近似重复文本索引
+
+    文本去掉来源前缀、标点和空白后按字符切分为k字片段（shingle），用bands×rows个哈希函数计算
+    MinHash签名。签名分为bands段，每段rows个值，任意一段完全相同的文本成为候选，
+    只对候选计算片段集合的Jaccard相似度，因此查找的开销与已索引的文本数量基本无关。
+    """
+
+    def __init__(self, threshold=None, shingle_size=None, bands=None, rows=None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.7))
+        self.shingle_size = shingle_size or int(os.getenv("NEAR_DUPLICATE_SHINGLE_SIZE", 5))
+        self.bands = bands or int(os.getenv("NEAR_DUPLICATE_BANDS", 16))
+        self.rows = rows or int(os.getenv("NEAR_DUPLICATE_ROWS", 4))
+        # 固定种子，保证同一文本在不同进程和重启后的签名一致
+        rng = random.Random(self.shingle_size * 1000003 + self.bands * self.rows)
+        self._permutations = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(self.bands * self.rows)
+        ]
+        self._buckets = [{} for _ in range(self.bands)]   # 每段：段签名 -> [key]
+        self._shingles = {}                                # key -> 片段哈希集合
+        self._counters = {"lookups": 0, "candidates": 0, "matches": 0}
+        self._last = (None, None)   # 最近一次计算的 (文本, (片段集合, 签名))，find之后add同一文本时复用
+
+    def shingles(self, text):
+        """文本正文的k字片段哈希集合"""
+        _, body = split_attribution(text)
+        normalized = _NON_WORD.sub("", body.lower())
+        k = self.shingle_size
+        if len(normalized) <= k:
+            return {zlib.crc32(normalized.encode("utf-8"))}
+        return {zlib.crc32(normalized[i:i + k].encode("utf-8")) for i in range(len(normalized) - k + 1)}
+
+    def signature(self, shingles):
+        return [min((a * x + b) % _PRIME for x in shingles) for a, b in self._permutations]
+
+    def find(self, text):
+        """查找与text近似重复的已索引文本，返回最相似者的key，没有时返回None"""
+        shingles, signature = self._prepare(text)
+        self._counters["lookups"] += 1
+        best_key, best_similarity = None, self.threshold
+        for key in self._candidates(signature):
+            self._counters["candidates"] += 1
+            other = self._shingles[key]
+            similarity = len(shingles & other) / len(shingles | other)
+            if similarity >= best_similarity:
+                best_key, best_similarity = key, similarity
+        if best_key is not None:
+            self._counters["matches"] += 1
+        return best_key
+
+    def add(self, key, text):
+        shingles, signature = self._prepare(text)
+        self._shingles[key] = shingles
+        for band, bucket in zip(self._bands(signature), self._buckets):
+            bucket.setdefault(band, []).append(key)
+
+    def stats(self):
+        return dict(self._counters, entries=len(self._shingles))
+
+    def _prepare(self, text):
+        last_text, prepared = self._last
+        if last_text != text:
+            shingles = self.shingles(text)
+            prepared = (shingles, self.signature(shingles))
+            self._last = (text, prepared)
+        return prepared
+
+    def _bands(self, signature):
+        rows = self.rows
+        return [tuple(signature[i * rows:(i + 1) * rows]) for i in range(self.bands)]
+
+    def _candidates(self, signature):
+        seen = set()
+        for band, bucket in zip(self._bands(signature), self._buckets):
+            for key in bucket.get(band, ()):
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+class FindingDeduplicator:
+    """在一个发现列表上合并近似重复的发现
+
+    新发现与列表中已有的发现近似重复时不再追加，而是把它的来源合并到已有发现中；
+    直接修改传入的列表（由finding_list创建），已有的条目只建立索引，不互相合并。
+    正文完全相同的发现按列表的键索引直接找到，不计算MinHash签名。
+    """
+
+    def __init__(self, findings=None, index=None):
+        self.findings = findings if findings is not None else finding_list()
+        self.index = index or NearDuplicateIndex()
+        self.duplicates = 0
+        self.chars_saved = 0   # 合并后少发送给模型的字符数
+        self._lock = threading.Lock()
+        for position, finding in enumerate(self.findings):
+            self.index.add(position, finding)
+
+    def add(self, finding):
+        """加入一条发现，返回 (在列表中的位置, 是否为新发现)"""
+        with self._lock:
+            position = self.findings.position_of(finding)
+            exact = position is not None
+            if not exact:
+                position = self.index.find(finding)
+            if position is None:
+                position = len(self.findings)
+                self.findings.append(finding)
+                self.index.add(position, finding)
+                return position, True
+            existing = self.findings[position]
+            merged = merge_findings(existing, finding)
+            if exact and merged == existing:
+                return position, False   # 重复出现的同一条发现，不计入合并
+            self.findings[position] = merged
+            self.duplicates += 1
+            self.chars_saved += len(finding) - (len(merged) - len(existing))
+            return position, False
+
+    def stats(self):
+        with self._lock:
+            return dict(self.index.stats(), duplicates=self.duplicates, chars_saved=self.chars_saved)
+
+def deduplicate_findings(findings):
+    """合并发现列表中的近似重复项，返回 (合并后的列表, 统计)"""
+    deduplicator = FindingDeduplicator()
+    for finding in findings:
+        deduplicator.add(finding)
+    return deduplicator.findings, deduplicator.stats()
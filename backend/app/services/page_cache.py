@@ -0,0 +1,180 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+def parse_cache_control(value):
+    """解析Cache-Control响应头，返回 {指令: 值}，无值的指令对应True"""
+    directives = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition("=")
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else True
+    return directives
+
+class PageCache:
+    """网页正文缓存：按URL保存提取后的正文及ETag/Last-Modified
+
+    - 新鲜期内直接返回缓存的正文，不发出请求
+    - 新鲜期过后携带If-None-Match/If-Modified-Since重新验证，304时沿用缓存
+    - 遵循Cache-Control的max-age、no-cache和no-store
+    - 总字节数超过上限时按最近访问时间淘汰（LRU）
+    """
+
+    def __init__(self, path=None, max_bytes=None, default_ttl=None):
+        self.enabled = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+        self.path = path or os.getenv("PAGE_CACHE_PATH", "page_cache.db")
+        self.max_bytes = max_bytes or int(os.getenv("PAGE_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+        # 响应没有给出max-age时的新鲜期（秒）
+        self.default_ttl = default_ttl if default_ttl is not None else float(os.getenv("PAGE_CACHE_DEFAULT_TTL", 3600))
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "stale": 0, "revalidated": 0, "misses": 0, "stores": 0, "uncacheable": 0, "evictions": 0}
+        self._conn = None
+        self._total_bytes = 0
+        if not self.enabled:
+            return
+        try:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS page_cache "
+                    "(url TEXT PRIMARY KEY, content TEXT, etag TEXT, last_modified TEXT, "
+                    "fresh_until REAL, size INTEGER, last_access REAL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS page_cache_access ON page_cache (last_access)")
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM page_cache").fetchone()[0]
+            logger.info(f"初始化网页缓存: {self.path}, 已用 {self._total_bytes} 字节")
+        except Exception as e:
+            logger.warning(f"无法打开网页缓存文件 {self.path}，网页缓存已关闭: {str(e)}")
+            self._conn = None
+
+    def lookup(self, url):
+        """查找缓存条目，返回 {"content", "etag", "last_modified", "fresh"}，不存在时返回None"""
+        if self._conn is None:
+            return None
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT content, etag, last_modified, fresh_until FROM page_cache WHERE url = ?", (url,)
+                ).fetchone()
+                if row is None:
+                    self._counters["misses"] += 1
+                    return None
+                with self._conn:
+                    self._conn.execute("UPDATE page_cache SET last_access = ? WHERE url = ?", (now, url))
+            except Exception as e:
+                logger.warning(f"读取网页缓存失败: {str(e)}")
+                return None
+            fresh = row[3] > now
+            self._counters["hits" if fresh else "stale"] += 1
+        return {"content": row[0], "etag": row[1], "last_modified": row[2], "fresh": fresh}
+
+    def conditional_headers(self, entry):
+        """重新验证请求的条件请求头"""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def revalidated(self, url, response_headers):
+        """服务器返回304：刷新新鲜期，沿用缓存的正文"""
+        if self._conn is None:
+            return
+        fresh_until = self._fresh_until(parse_cache_control(response_headers.get("Cache-Control")))
+        with self._lock:
+            self._counters["revalidated"] += 1
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE page_cache SET fresh_until = ?, etag = COALESCE(?, etag), "
+                        "last_modified = COALESCE(?, last_modified), last_access = ? WHERE url = ?",
+                        (fresh_until, response_headers.get("ETag"), response_headers.get("Last-Modified"),
+                         time.time(), url)
+                    )
+            except Exception as e:
+                logger.warning(f"更新网页缓存失败: {str(e)}")
+
+    def store(self, url, content, response_headers):
+        """保存网页正文；响应禁止缓存（no-store/private）时删除已有条目"""
+        if self._conn is None:
+            return
+        directives = parse_cache_control(response_headers.get("Cache-Control"))
+        if "no-store" in directives or "private" in directives:
+            with self._lock:
+                self._counters["uncacheable"] += 1
+                self._delete(url)
+            return
+
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                self._delete(url)
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT INTO page_cache (url, content, etag, last_modified, fresh_until, size, last_access) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (url, content, response_headers.get("ETag"), response_headers.get("Last-Modified"),
+                         self._fresh_until(directives), size, now)
+                    )
+                self._total_bytes += size
+                self._counters["stores"] += 1
+                self._evict()
+            except Exception as e:
+                logger.warning(f"写入网页缓存失败: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, bytes=self._total_bytes, max_bytes=self.max_bytes, enabled=self._conn is not None)
+
+    def _fresh_until(self, directives):
+        now = time.time()
+        if "no-cache" in directives:
+            return now  # 每次使用前都需要重新验证
+        for name in ("s-maxage", "max-age"):
+            value = directives.get(name)
+            if isinstance(value, str) and re.fullmatch(r"\d+", value):
+                return now + int(value)
+        return now + self.default_ttl
+
+    def _delete(self, url):
+        row = self._conn.execute("SELECT size FROM page_cache WHERE url = ?", (url,)).fetchone()
+        if row is not None:
+            with self._conn:
+                self._conn.execute("DELETE FROM page_cache WHERE url = ?", (url,))
+            self._total_bytes -= row[0]
+
+    def _evict(self):
+        """按最近访问时间淘汰，直到总字节数回到上限以内"""
+        if self._total_bytes > self.max_bytes:
+            # 其他worker也会写入同一个缓存文件，淘汰前以数据库中的实际大小为准
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM page_cache").fetchone()[0]
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT url, size FROM page_cache ORDER BY last_access LIMIT 50"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            freed = []
+            for url, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                freed.append((url,))
+                self._total_bytes -= size
+            with self._conn:
+                self._conn.executemany("DELETE FROM page_cache WHERE url = ?", freed)
+            self._counters["evictions"] += len(freed)
@@ -0,0 +1,455 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from app.services.research_events import event_buffer_size
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 频繁变化的小字段：逐字段写入，写入成本低
+HOT_FIELDS = [
+    "topic", "requirements", "status", "progress", "plan", "current_step",
+    "current_step_index", "report", "error", "start_time"
+]
+
+# 体积较大的字段：只在检查点整体保存，读取时按需加载
+BULK_FIELDS = [
+    "research_steps", "research_sites", "research_findings", "analysis_results",
+    "search_queries", "pipeline_stats", "cancellation", "versions"
+]
+
+# 网页内容按URL逐条增量保存
+PAGE_FIELD = "source_contents"
+
+# 研究过程不会再产生进度事件的状态
+FINISHED_STATUSES = ["completed", "error", "cancelled"]
+
+# claim不检查原执行节点时使用的expected_owner
+ANY_OWNER = object()
+
+class ProcessStore:
+    """研究过程存储接口
+
+    ResearchProcess在热字段被赋值时调用update_hot，在检查点调用save_bulk；
+    不在本进程内运行的研究过程通过get从存储中恢复。
+    """
+
+    persistent = False
+
+    def add(self, process):
+        """登记新创建的研究过程"""
+        raise NotImplementedError
+
+    def get(self, process_id):
+        """获取研究过程，不存在时返回None"""
+        raise NotImplementedError
+
+    def get_status(self, process_id):
+        """只读取研究过程的状态，不存在时返回None"""
+        process = self.get(process_id)
+        return process.status if process else None
+
+    def update_hot(self, process_id, field, value):
+        """更新一个热字段"""
+
+    def save_bulk(self, process):
+        """保存大字段（检查点）"""
+
+    def load_bulk(self, process_id, field):
+        """按需读取一个大字段，不存在时返回None"""
+        return None
+
+    def append_event(self, process_id, event):
+        """保存一条进度事件，供其他worker上的订阅者读取"""
+
+    def events_since(self, process_id, last_id):
+        """读取ID大于last_id的进度事件，返回(事件列表, 是否有事件已被淘汰)"""
+        process = self.get(process_id)
+        return process.events.since(last_id) if process else ([], False)
+
+    def last_event_id(self, process_id):
+        """已保存的最后一个事件ID"""
+        return 0
+
+    def list_processes(self, statuses=None, orphaned=False):
+        """列出研究过程ID，可按状态过滤；orphaned为True时只返回执行节点已不存在的过程"""
+        return []
+
+    def get_owner(self, process_id):
+        """执行该研究过程的节点ID"""
+        return None
+
+    def claim(self, process_id, expected_status, new_status, expected_owner=ANY_OWNER):
+        """原子地将状态从expected_status改为new_status并由本节点接管，
+        状态或执行节点（指定expected_owner时）已被其他节点改变时返回False（防止多个节点重复确认或恢复）"""
+        raise NotImplementedError
+
+    def is_orphaned(self, process_id):
+        """研究过程的执行节点是否已不存在（停止发送心跳）"""
+        return True
+
+    def acquire_run_slot(self, slot_id, limit):
+        """占用一个研究运行槽位，共享存储的所有worker合计已占用limit个时返回False"""
+        return True
+
+    def release_run_slot(self, slot_id):
+        """释放研究运行槽位"""
+
+class MemoryProcessStore(ProcessStore):
+    """内存存储：研究过程对象直接保存在字典中（单进程部署的默认方式）"""
+
+    def __init__(self):
+        self._processes = {}
+
+    def add(self, process):
+        self._processes[process.process_id] = process
+
+    def get(self, process_id):
+        return self._processes.get(process_id)
+
+    def list_processes(self, statuses=None, orphaned=False):
+        # 内存存储中的研究过程只可能在本进程内执行，无需判断执行节点
+        return [
+            process_id for process_id, process in self._processes.items()
+            if statuses is None or process.status in statuses
+        ]
+
+    def claim(self, process_id, expected_status, new_status, expected_owner=ANY_OWNER):
+        process = self._processes.get(process_id)
+        with process.lock:
+            if process.status != expected_status:
+                return False
+            process.status = new_status
+            return True
+
+class SQLiteProcessStore(ProcessStore):
+    """SQLite存储：多个gunicorn worker共享同一个数据库文件
+
+    - 热字段写入先在内存中合并，由后台线程按固定间隔批量提交，避免每次赋值都落盘
+    - 大字段在检查点以JSON整体保存，恢复时按需读取
+    - 网页内容按URL逐条保存，只写入新增的页面
+    - 每个存储实例（即每个worker）有独立的节点ID，由后台线程定期写入心跳；研究过程记录执行节点，
+      执行节点的心跳超过node_timeout秒未更新时视为已中断，可由其他节点接管
+    - 研究运行槽位记录在共享表中，所有worker合计的并发研究数不超过上限；停止心跳的节点的槽位自动释放
+    """
+
+    persistent = True
+
+    def __init__(self, path=None, flush_interval=None):
+        self.path = path or os.getenv("RESEARCH_STORE_PATH", "research_store.db")
+        self.flush_interval = flush_interval or float(os.getenv("RESEARCH_STORE_FLUSH_INTERVAL", 0.5))
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self._pending_hot = {}      # process_id -> {field: value}
+        self._pending_events = []   # (process_id, event_id, type, data, time)
+        self.event_capacity = event_buffer_size()
+        self._saved_pages = {}      # process_id -> 已保存的URL集合
+        self.node_id = uuid.uuid4().hex
+        self.heartbeat_interval = float(os.getenv("RESEARCH_NODE_HEARTBEAT_INTERVAL", 5))
+        self.node_timeout = float(os.getenv("RESEARCH_NODE_TIMEOUT", 30))
+        # 未记录执行节点的旧数据，仍按超过该秒数没有更新判定为已中断
+        self.legacy_stale_seconds = float(os.getenv("RESEARCH_RESUME_STALE_SECONDS", 300))
+        self._last_heartbeat = 0.0
+        self._create_tables()
+        self.heartbeat()
+
+        flusher = threading.Thread(target=self._flush_loop, name="process-store-flusher")
+        flusher.daemon = True
+        flusher.start()
+        logger.info(f"初始化SQLite研究过程存储: {self.path}")
+
+    def _create_tables(self):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS research_processes "
+                f"(process_id TEXT PRIMARY KEY, {', '.join(HOT_FIELDS)}, updated_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS research_process_fields "
+                "(process_id TEXT, field TEXT, value TEXT, PRIMARY KEY (process_id, field))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS research_process_pages "
+                "(process_id TEXT, url TEXT, content TEXT, PRIMARY KEY (process_id, url))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS research_process_events "
+                "(process_id TEXT, event_id INTEGER, type TEXT, data TEXT, time REAL, "
+                "PRIMARY KEY (process_id, event_id))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS research_nodes (node_id TEXT PRIMARY KEY, heartbeat_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS research_run_slots "
+                "(slot_id TEXT PRIMARY KEY, node_id TEXT, acquired_at REAL)"
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(research_processes)")]
+            if "owner" not in columns:
+                self._conn.execute("ALTER TABLE research_processes ADD COLUMN owner TEXT")
+
+    def add(self, process):
+        values = [getattr(process, field) for field in HOT_FIELDS]
+        placeholders = ", ".join("?" for _ in range(len(HOT_FIELDS) + 3))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO research_processes (process_id, {', '.join(HOT_FIELDS)}, updated_at, owner) "
+                f"VALUES ({placeholders})",
+                [process.process_id] + values + [time.time(), self.node_id]
+            )
+        # 创建过程中已产生的事件
+        for event in process.events.since(0)[0]:
+            self.append_event(process.process_id, event)
+        self.save_bulk(process)
+
+    def get(self, process_id):
+        from app.services.research_service import ResearchProcess
+
+        # 先提交尚未写入的热字段，保证读到最新状态
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(HOT_FIELDS)} FROM research_processes WHERE process_id = ?",
+                (process_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return ResearchProcess.restore(process_id, dict(zip(HOT_FIELDS, row)), self)
+
+    def get_status(self, process_id):
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status FROM research_processes WHERE process_id = ?", (process_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def update_hot(self, process_id, field, value):
+        with self._lock:
+            self._pending_hot.setdefault(process_id, {})[field] = value
+            if field == "status" and value in FINISHED_STATUSES:
+                # 结束的研究过程不再保存新网页，释放已保存URL的记录
+                self._saved_pages.pop(process_id, None)
+
+    def append_event(self, process_id, event):
+        data = json.dumps(event["data"], ensure_ascii=False)
+        with self._lock:
+            self._pending_events.append((process_id, event["id"], event["type"], data, event["time"]))
+
+    def events_since(self, process_id, last_id):
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT event_id, type, data, time FROM research_process_events "
+                "WHERE process_id = ? AND event_id > ? ORDER BY event_id",
+                (process_id, last_id)
+            ).fetchall()
+            oldest = self._conn.execute(
+                "SELECT MIN(event_id) FROM research_process_events WHERE process_id = ?", (process_id,)
+            ).fetchone()[0]
+        events = [{"id": row[0], "type": row[1], "data": json.loads(row[2]), "time": row[3]} for row in rows]
+        return events, oldest is not None and last_id < oldest - 1
+
+    def last_event_id(self, process_id):
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(event_id) FROM research_process_events WHERE process_id = ?", (process_id,)
+            ).fetchone()
+        return row[0] or 0
+
+    def flush(self):
+        """批量提交合并后的热字段更新和进度事件"""
+        with self._lock:
+            if not self._pending_hot and not self._pending_events:
+                return
+            pending, self._pending_hot = self._pending_hot, {}
+            events, self._pending_events = self._pending_events, []
+            try:
+                with self._conn:
+                    now = time.time()
+                    for process_id, fields in pending.items():
+                        # 已被其他worker取消的研究过程不会被本节点的状态写入覆盖
+                        assignments = ", ".join(
+                            "status = CASE WHEN status = 'cancelled' THEN status ELSE ? END" if field == "status"
+                            else f"{field} = ?"
+                            for field in fields
+                        )
+                        self._conn.execute(
+                            f"UPDATE research_processes SET {assignments}, updated_at = ? WHERE process_id = ?",
+                            list(fields.values()) + [now, process_id]
+                        )
+                    if events:
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO research_process_events (process_id, event_id, type, data, time) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            events
+                        )
+                        # 每个研究过程只保留最近的事件，与内存中的环形缓冲区一致
+                        latest = {}
+                        for process_id, event_id, _, _, _ in events:
+                            latest[process_id] = max(latest.get(process_id, 0), event_id)
+                        self._conn.executemany(
+                            "DELETE FROM research_process_events WHERE process_id = ? AND event_id <= ?",
+                            [(process_id, event_id - self.event_capacity) for process_id, event_id in latest.items()]
+                        )
+            except Exception as e:
+                logger.error(f"写入研究过程状态失败: {str(e)}")
+
+    def save_bulk(self, process):
+        process_id = process.process_id
+        # 大字段可能正被其他线程修改，在进程锁内序列化
+        with process.lock:
+            values = [(process_id, field, json.dumps(getattr(process, field), ensure_ascii=False))
+                      for field in BULK_FIELDS]
+            pages = dict(getattr(process, PAGE_FIELD))
+
+        with self._lock:
+            saved = self._saved_pages.setdefault(process_id, set())
+            new_pages = [(process_id, url, content) for url, content in pages.items() if url not in saved]
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO research_process_fields (process_id, field, value) VALUES (?, ?, ?)",
+                        values
+                    )
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO research_process_pages (process_id, url, content) VALUES (?, ?, ?)",
+                        new_pages
+                    )
+                saved.update(url for _, url, _ in new_pages)
+            except Exception as e:
+                logger.error(f"保存研究过程检查点失败: {str(e)}")
+            if process.status in FINISHED_STATUSES:
+                self._saved_pages.pop(process_id, None)
+        self.flush()
+
+    def load_bulk(self, process_id, field):
+        with self._lock:
+            if field == PAGE_FIELD:
+                rows = self._conn.execute(
+                    "SELECT url, content FROM research_process_pages WHERE process_id = ?",
+                    (process_id,)
+                ).fetchall()
+                return dict(rows)
+            row = self._conn.execute(
+                "SELECT value FROM research_process_fields WHERE process_id = ? AND field = ?",
+                (process_id, field)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_processes(self, statuses=None, orphaned=False):
+        self.flush()
+        sql = "SELECT process_id FROM research_processes WHERE 1 = 1"
+        params = []
+        if statuses:
+            sql += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        if orphaned:
+            condition, condition_params = self._orphaned_condition()
+            sql += f" AND {condition}"
+            params.extend(condition_params)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [row[0] for row in rows]
+
+    def get_owner(self, process_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT owner FROM research_processes WHERE process_id = ?", (process_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def claim(self, process_id, expected_status, new_status, expected_owner=ANY_OWNER):
+        self.flush()
+        sql = (
+            "UPDATE research_processes SET status = ?, owner = ?, updated_at = ? "
+            "WHERE process_id = ? AND status = ?"
+        )
+        params = [new_status, self.node_id, time.time(), process_id, expected_status]
+        if expected_owner is not ANY_OWNER:
+            sql += " AND owner IS ?"
+            params.append(expected_owner)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(sql, params)
+        return cursor.rowcount == 1
+
+    def is_orphaned(self, process_id):
+        self.flush()
+        condition, params = self._orphaned_condition()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT 1 FROM research_processes WHERE process_id = ? AND {condition}", [process_id] + params
+            ).fetchone()
+        return row is not None
+
+    def acquire_run_slot(self, slot_id, limit):
+        now = time.time()
+        with self._lock:
+            # 立即获取写锁，使多个worker之间的统计和占用是原子的
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 停止发送心跳的节点占用的槽位视为已释放
+                self._conn.execute(
+                    "DELETE FROM research_run_slots WHERE NOT EXISTS (SELECT 1 FROM research_nodes "
+                    "WHERE research_nodes.node_id = research_run_slots.node_id AND heartbeat_at >= ?)",
+                    (now - self.node_timeout,)
+                )
+                used = self._conn.execute("SELECT COUNT(*) FROM research_run_slots").fetchone()[0]
+                if used < limit:
+                    self._conn.execute(
+                        "INSERT INTO research_run_slots (slot_id, node_id, acquired_at) VALUES (?, ?, ?)",
+                        (slot_id, self.node_id, now)
+                    )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return used < limit
+
+    def release_run_slot(self, slot_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM research_run_slots WHERE slot_id = ?", (slot_id,))
+
+    def heartbeat(self):
+        """写入本节点的心跳"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO research_nodes (node_id, heartbeat_at) VALUES (?, ?)", (self.node_id, now)
+            )
+            # 顺带清理早已停止的节点
+            self._conn.execute("DELETE FROM research_nodes WHERE heartbeat_at < ?", (now - 100 * self.node_timeout,))
+        self._last_heartbeat = now
+
+    def _orphaned_condition(self):
+        """执行节点已不存在的SQL条件：其他节点执行且该节点心跳已超时；未记录执行节点的旧数据按更新时间判断"""
+        now = time.time()
+        condition = (
+            "((owner IS NULL AND updated_at < ?) OR (owner IS NOT NULL AND owner != ? AND NOT EXISTS "
+            "(SELECT 1 FROM research_nodes WHERE node_id = owner AND heartbeat_at >= ?)))"
+        )
+        return condition, [now - self.legacy_stale_seconds, self.node_id, now - self.node_timeout]
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+            if time.time() - self._last_heartbeat >= self.heartbeat_interval:
+                try:
+                    self.heartbeat()
+                except Exception as e:
+                    logger.error(f"写入节点心跳失败: {str(e)}")
+
+def create_process_store():
+    """根据RESEARCH_STORE配置创建存储后端: memory(默认) 或 sqlite"""
+    backend = os.getenv("RESEARCH_STORE", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteProcessStore()
+    return MemoryProcessStore()
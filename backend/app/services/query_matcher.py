@@ -0,0 +1,156 @@
+import os
+import re
+import logging
+import threading
+from collections import OrderedDict
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 不作为关键词的常见无意义词
+STOPWORDS = ['研究', '问题', '什么', '怎么', '为什么', '如何', '分析']
+
+_CHINESE = re.compile(r'[\u4e00-\u9fa5]')
+
+def extract_query_keywords(query):
+    """拆分查询关键词和短语：空格分词、相邻两词短语、中文2-4字片段"""
+    query_parts = query.lower()
+    # 处理多种分隔符
+    query_parts = re.sub(r'[-_\s]', ' ', query_parts)
+
+    # 1. 按空格划分
+    space_split_keywords = [word for word in query_parts.split() if len(word) > 2]
+
+    # 2. 尝试提取短语(连续2-3个词)
+    phrases = []
+    words = query_parts.split()
+    if len(words) >= 2:
+        for i in range(len(words)-1):
+            if len(words[i]) > 1 and len(words[i+1]) > 1:  # 确保不是单个字符
+                phrases.append(f"{words[i]} {words[i+1]}")
+
+    # 3. 特殊处理中文查询：提取连续2-4个字符
+    chinese_keywords = []
+    if _CHINESE.search(query_parts):
+        for i in range(len(query_parts)):
+            for size in (2, 3, 4):
+                if i+size <= len(query_parts):
+                    chunk = query_parts[i:i+size]
+                    if _CHINESE.search(chunk) and len(chunk.strip()) > size - 1:
+                        chinese_keywords.append(chunk)
+
+    # 组合所有提取的关键词，去除重复并过滤常见的无意义词
+    query_keywords = space_split_keywords + phrases + chinese_keywords
+    query_keywords = [k for k in query_keywords if k.strip() and k.strip().lower() not in STOPWORDS]
+    query_keywords = list(set(query_keywords))
+
+    # 如果终究没有有效关键词，使用原始查询
+    if not query_keywords:
+        query_keywords = [query_parts]
+    return query_keywords
+
+def _trie_pattern(words):
+    """把一组词编译成前缀树形式的正则，同一位置优先匹配最长的词"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        end = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            # 当前位置已构成完整的词，后续字符可选（贪婪匹配取最长）
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+class QueryMatcher:
+    """针对一个查询预先编译的句子匹配器
+
+    查询的关键词、关键词的组成部分和相关词编译成一个前缀树正则，每个句子只扫描一遍
+    即可得到出现的全部词，再按原有规则计算关键词得分。同一查询抓取的所有网页共用一个匹配器；
+    与查询无关的数据价值得分由DocumentAnalysis预先计算。
+    """
+
+    def __init__(self, query, related_terms):
+        self.query = query
+        self.keywords = extract_query_keywords(query)
+        # 每个关键词的打分规则需要的词：组成部分（部分匹配）和相关词（语义匹配）
+        self._rules = []
+        for keyword in self.keywords:
+            parts = [part for part in keyword.split() if len(part) > 3] if len(keyword) > 4 else []
+            self._rules.append((
+                keyword,
+                3 + (1 if _CHINESE.search(keyword) and len(keyword) >= 3 else 0),
+                parts,
+                [term for term in related_terms(keyword) if term]
+            ))
+
+        words = set(self.keywords)
+        for _, _, parts, related in self._rules:
+            words.update(parts)
+            words.update(related)
+        words.discard("")
+        # 较长的词包含的其他词：匹配到长词时这些词必然也出现在句子中
+        self._contained = {word: {other for other in words if other != word and other in word} for word in words}
+        # 在每个位置用前瞻匹配最长的词，不消耗字符，因此能找到相互重叠的词
+        self._pattern = re.compile("(?=(" + _trie_pattern(words) + "))") if words else None
+
+    def find_terms(self, sentence_lower):
+        """单次扫描，返回句子中出现的所有词"""
+        found = set()
+        if self._pattern is None:
+            return found
+        for match in self._pattern.finditer(sentence_lower):
+            word = match.group(1)
+            if word and word not in found:
+                found.add(word)
+                found.update(self._contained[word])
+        return found
+
+    def keyword_score(self, sentence_lower):
+        """计算句子与查询关键词的匹配得分（句子需已转为小写）"""
+        found = self.find_terms(sentence_lower)
+        if not found:
+            return 0
+
+        exact_match_score = 0     # 精确匹配得分
+        partial_match_score = 0    # 部分匹配得分
+        semantic_match_score = 0    # 语义相关得分
+        for keyword, weight, parts, related in self._rules:
+            if keyword in found:
+                exact_match_score += weight
+            elif parts and any(part in found for part in parts):
+                partial_match_score += 1
+            elif any(term in found for term in related):
+                semantic_match_score += 0.5
+        return exact_match_score * 1.5 + partial_match_score + semantic_match_score
+
+class QueryMatcherCache:
+    """按查询缓存QueryMatcher，最近使用的查询的匹配器会被保留复用"""
+
+    def __init__(self, related_terms, max_entries=None):
+        self.related_terms = related_terms
+        self.max_entries = max_entries or int(os.getenv("QUERY_MATCHER_CACHE_SIZE", 256))
+        self._matchers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query):
+        with self._lock:
+            matcher = self._matchers.get(query)
+            if matcher is not None:
+                self._matchers.move_to_end(query)
+                return matcher
+        matcher = QueryMatcher(query, self.related_terms)
+        with self._lock:
+            self._matchers[query] = matcher
+            while len(self._matchers) > self.max_entries:
+                self._matchers.popitem(last=False)
+        return matcher
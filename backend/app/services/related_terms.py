@@ -0,0 +1,111 @@
+import os
+import json
+import logging
+from bisect import bisect_left
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 内置的通用关键词映射表：基础词 -> 语义相关词
+DEFAULT_TERM_MAP = {
+    # 中文常见语义相关映射
+    '研究': ['分析', '调查', '考察', '实验', '探索', '测试'],
+    '市场': ['销售', '行业', '商业', '销量', '客户', '消费', '商品', '产品'],
+    '分析': ['评估', '解析', '比较', '评价', '考量', '研判'],
+    '数据': ['统计', '信息', '资料', '表格', '指标', '百分比', '占比'],
+    '趋势': ['发展', '走势', '变化', '潮流', '未来', '增长', '上涨', '下降'],
+    '竞争': ['对手', '对比', '比较', '竞争者', '竞争格局', '竞争对手'],
+    '问题': ['困难', '障碍', '挑战', '瓶颈', '矛盾'],
+    '发展': ['增长', '扩大', '提升', '改进', '进步'],
+    '成本': ['支出', '费用', '价格', '花费', '投入'],
+    '效益': ['回报', '利润', '收益', '效益率', '投资回报'],
+    # 英文常见语义相关映射
+    'market': ['industry', 'business', 'commercial', 'customers', 'consumers', 'sales'],
+    'analysis': ['evaluation', 'assessment', 'research', 'study', 'investigation', 'examination'],
+    'data': ['statistics', 'figures', 'information', 'metrics', 'indicators', 'percentage'],
+    'trend': ['development', 'movement', 'change', 'growth', 'future', 'evolution'],
+    'cost': ['expense', 'expenditure', 'payment', 'investment', 'price'],
+    'benefit': ['profit', 'return', 'gain', 'advantage', 'roi', 'return on investment']
+}
+
+def load_term_map(path):
+    """从JSON文件读取关键词映射表，格式为 {"基础词": ["相关词", ...]}"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("关键词映射表必须是JSON对象")
+    return {str(base): [str(term) for term in terms] for base, terms in data.items()}
+
+def build_term_map(path=None):
+    """内置映射表合并RELATED_TERMS_PATH指定文件中的映射，文件中的相关词追加到同名基础词下"""
+    term_map = {base: list(terms) for base, terms in DEFAULT_TERM_MAP.items()}
+    path = path or os.getenv("RELATED_TERMS_PATH")
+    if not path:
+        return term_map
+    try:
+        extra = load_term_map(path)
+    except Exception as e:
+        logger.error(f"读取关键词映射表 {path} 失败，仅使用内置映射: {str(e)}")
+        return term_map
+    for base, terms in extra.items():
+        merged = term_map.setdefault(base, [])
+        merged.extend(term for term in terms if term not in merged)
+    logger.info(f"已加载关键词映射表 {path}，共 {len(extra)} 个基础词")
+    return term_map
+
+class RelatedTermsIndex:
+    """相关词索引，构建后查询耗时与映射表大小基本无关
+
+    - 关键词本身是基础词时直接返回其相关词
+    - 否则找出映射表中与关键词互相包含的词：包含于关键词的词通过枚举关键词的子串查找，
+      包含关键词的词通过所有词的后缀排序表二分查找
+    - 匹配到基础词时加入其相关词；匹配到相关词时加入其基础词及同组的其他相关词
+    """
+
+    def __init__(self, term_map):
+        self._exact = {}
+        expansions = {}
+        for base, terms in term_map.items():
+            base = base.lower()
+            terms = [term.lower() for term in terms if term]
+            self._exact[base] = terms
+            expansions.setdefault(base, set()).update(terms)
+            for term in terms:
+                expansion = expansions.setdefault(term, set())
+                expansion.add(base)
+                expansion.update(t for t in terms if t != term)
+        self._expansions = {word: frozenset(related) for word, related in expansions.items() if word}
+        self._max_length = max((len(word) for word in self._expansions), default=0)
+        suffixes = sorted((word[i:], word) for word in self._expansions for i in range(len(word)))
+        self._suffixes = [suffix for suffix, _ in suffixes]
+        self._suffix_words = [word for _, word in suffixes]
+
+    def __len__(self):
+        return len(self._expansions)
+
+    def lookup(self, keyword):
+        """返回与关键词语义相关的词汇列表"""
+        keyword = keyword.lower()
+        if keyword in self._exact:
+            return list(self._exact[keyword])
+
+        related = set()
+        # 包含于关键词中的词
+        for start in range(len(keyword)):
+            for end in range(start + 1, min(len(keyword), start + self._max_length) + 1):
+                expansion = self._expansions.get(keyword[start:end])
+                if expansion:
+                    related.update(expansion)
+        # 包含关键词的词：以关键词开头的后缀
+        index = bisect_left(self._suffixes, keyword)
+        while index < len(self._suffixes) and self._suffixes[index].startswith(keyword):
+            related.update(self._expansions[self._suffix_words[index]])
+            index += 1
+        return list(related)
+
+# 全局相关词索引，加载时构建一次
+related_terms_index = RelatedTermsIndex(build_term_map())
+
+def get_related_terms(keyword):
+    """生成与给定关键词语义相关的词汇"""
+    return related_terms_index.lookup(keyword)
@@ -0,0 +1,59 @@
+import os
+import time
+import threading
+from collections import deque
+
+# 事件类型
+EVENT_STATUS = "status"                  # 研究过程状态变化
+EVENT_STEP_STARTED = "step_started"      # 开始执行研究步骤
+EVENT_QUERY_ISSUED = "query_issued"      # 发出搜索查询
+EVENT_PAGE_FETCHED = "page_fetched"      # 抓取到网页内容
+EVENT_FINDING_ADDED = "finding_added"    # 新增研究发现
+EVENT_ANALYSIS_DONE = "analysis_done"    # 步骤分析完成
+EVENT_REPORT_READY = "report_ready"      # 研究报告已生成
+
+def event_buffer_size():
+    """每个研究过程保留的事件数量"""
+    return int(os.getenv("RESEARCH_EVENT_BUFFER_SIZE", 500))
+
+class EventBuffer:
+    """研究过程的进度事件环形缓冲区
+
+    事件ID单调递增，缓冲区只保留最近的若干条；客户端断线重连时凭Last-Event-ID
+    取回之后的事件，若所需事件已被淘汰则需要重新获取完整状态。
+    """
+
+    def __init__(self, capacity=None, last_id=0):
+        self.capacity = capacity or event_buffer_size()
+        self._events = deque(maxlen=self.capacity)
+        self._next_id = last_id + 1  # 从存储恢复时接续已有的事件ID
+        self._cond = threading.Condition()
+
+    def append(self, event_type, data):
+        """追加事件并唤醒等待中的订阅者，返回事件"""
+        with self._cond:
+            event = {"id": self._next_id, "type": event_type, "data": data, "time": time.time()}
+            self._next_id += 1
+            self._events.append(event)
+            self._cond.notify_all()
+        return event
+
+    def since(self, last_id):
+        """返回ID大于last_id的事件
+
+        Returns:
+            (事件列表, 是否有事件已被淘汰)
+        """
+        with self._cond:
+            return self._since(last_id)
+
+    def wait(self, last_id, timeout):
+        """等待ID大于last_id的新事件，超时返回空列表"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._next_id - 1 > last_id, timeout)
+            return self._since(last_id)
+
+    def _since(self, last_id):
+        events = [event for event in self._events if event["id"] > last_id]
+        oldest = self._events[0]["id"] if self._events else self._next_id
+        return events, last_id < oldest - 1
@@ -0,0 +1,433 @@
+import os
+import time
+import queue
+import logging
+import threading
+from urllib.parse import urlparse
+from app.services.search_service import search_service
+from app.services.fanout_service import fanout_engine
+from app.services.cancellation import ResearchCancelled
+from app.services.near_duplicate import FindingDeduplicator, finding_list
+from app.services.indexed_list import IndexedList, site_list
+from app.services.research_events import EVENT_QUERY_ISSUED, EVENT_PAGE_FETCHED, EVENT_FINDING_ADDED
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 阶段名称，按数据流动顺序排列
+STAGE_NAMES = ["search", "fetch", "extract", "summarize", "analyze"]
+
+# 各阶段默认工作线程数
+DEFAULT_STAGE_WORKERS = {"search": 3, "fetch": 6, "extract": 2, "summarize": 2, "analyze": 2}
+
+# 工作线程退出信号
+_STOP = object()
+
+def _stage_workers(name):
+    """读取阶段工作线程数配置，例如 PIPELINE_FETCH_WORKERS=8"""
+    return int(os.getenv(f"PIPELINE_{name.upper()}_WORKERS", DEFAULT_STAGE_WORKERS[name]))
+
+class PipelineStage:
+    """流水线阶段：一组工作线程从有界输入队列中取出任务处理，并交给下一阶段
+
+    设置batch_size时，工作线程每次最多取出batch_size个已在队列中的任务，以列表形式交给handler
+    """
+
+    def __init__(self, name, handler, workers, queue_size, token, batch_size=None):
+        self.name = name
+        self.handler = handler
+        self.token = token
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.busy = 0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self, thread_prefix):
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{thread_prefix}-{self.name}-{n}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item):
+        """提交任务，队列已满时阻塞等待（背压）；研究取消时抛出ResearchCancelled"""
+        while True:
+            self.token.raise_if_cancelled()
+            try:
+                self.queue.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def stop(self):
+        if self.token.cancelled:
+            # 已取消：工作线程会自行退出，不等待仍在进行的请求，以便立即释放调度名额
+            for _ in self._threads:
+                try:
+                    self.queue.put_nowait(_STOP)
+                except queue.Full:
+                    break
+            return
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        with self.token.activate():
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    return
+                if self.token.cancelled:
+                    self._drain(item)
+                    return
+                batch, stop = self._collect_batch(item)
+                with self._lock:
+                    self.busy += 1
+                try:
+                    self.handler(item if self.batch_size is None else batch)
+                except ResearchCancelled:
+                    self.token.record_skip(self.name, len(batch))
+                except Exception as e:
+                    logger.error(f"流水线阶段 {self.name} 处理任务时出错: {str(e)}")
+                finally:
+                    with self._lock:
+                        self.busy -= 1
+                        self.processed += len(batch)
+                if stop:
+                    return
+
+    def _collect_batch(self, item):
+        """取出队列中已有的任务凑成一批，返回 (任务列表, 是否取到了退出信号)"""
+        batch = [item]
+        while self.batch_size is not None and len(batch) < self.batch_size:
+            try:
+                extra = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if extra is _STOP:
+                return batch, True
+            batch.append(extra)
+        return batch, False
+
+    def _drain(self, item):
+        """研究取消后丢弃队列中剩余的任务，并计入跳过的工作量"""
+        skipped = 0
+        while item is not None:
+            if item is not _STOP:
+                skipped += 1
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                item = None
+        if skipped:
+            self.token.record_skip(self.name, skipped)
+
+    def stats(self):
+        """当前队列深度与吞吐量"""
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "workers": self.workers,
+            "busy": self.busy,
+            "processed": self.processed,
+            "throughput": round(self.processed / elapsed, 3)  # 每秒处理的任务数
+        }
+
+class StepJob:
+    """一个核心研究问题在流水线中的执行状态"""
+
+    def __init__(self, step_index, step_title, queries, step_data, progress_label, previous_results=None):
+        self.step_index = step_index
+        self.step_title = step_title
+        self.queries = queries
+        self.step_data = step_data
+        self.progress_label = progress_label
+        # 步骤的搜索结果按URL、发现按正文索引（从检查点恢复的是普通列表）
+        for field, factory in (("search_results", site_list), ("findings", finding_list)):
+            if not isinstance(step_data.get(field), IndexedList):
+                step_data[field] = factory(step_data.get(field) or [])
+        # 按查询顺序预先分配结果结构，保证合并顺序与完成先后无关
+        self.query_results = [{"query": query, "results": [], "findings": []} for query in queries]
+        # 从检查点恢复时复用已完成的查询结果
+        completed = {result["query"]: result for result in previous_results or [] if result.get("completed")}
+        for query_idx, query in enumerate(queries):
+            if query in completed:
+                self.query_results[query_idx] = completed[query]
+        self.selected_results = [[] for _ in queries]   # 每个查询选中深入分析的搜索结果
+        self.extracted = [{} for _ in queries]          # 每个查询按结果排名存放提取的发现
+        self.pending_fetches = [0 for _ in queries]
+        self.pending_queries = len(queries)
+        self.step_slots = threading.BoundedSemaphore(fanout_engine.step_limit)
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.error = None
+
+class ResearchPipeline:
+    """研究执行流水线：搜索 → 抓取 → 提取 → 查询小结 → 步骤分析
+
+    每个阶段由独立的工作线程组成，阶段之间通过有界队列连接，
+    使不同查询、不同步骤的各阶段可以重叠执行，同时由队列容量限制内存占用。
+    """
+
+    def __init__(self, process, summarize_fn, queue_size=None):
+        self.process = process
+        self.summarize_fn = summarize_fn
+        self.token = process.cancel_token
+        self._jobs = []
+        # 研究过程的全部发现上的近似重复合并，首次分析步骤时建立
+        self._findings = None
+        # 各步骤分析提示词中合并掉的近似重复发现数和字符数
+        self._dedup_totals = {"duplicates": 0, "chars_saved": 0}
+        queue_size = queue_size or int(os.getenv("PIPELINE_QUEUE_SIZE", 16))
+        handlers = {
+            "search": self._search,
+            "fetch": self._fetch,
+            "extract": self._extract,
+            "summarize": self._summarize,
+            "analyze": self._analyze,
+        }
+        # 启用提取进程池时，提取阶段成批提交页面
+        batch_sizes = {"extract": int(os.getenv("PIPELINE_EXTRACT_BATCH", 4)) if search_service.extraction_pool.enabled else 1}
+        self.stages = {
+            name: PipelineStage(name, handlers[name], _stage_workers(name), queue_size, self.token, batch_sizes.get(name))
+            for name in STAGE_NAMES
+        }
+
+    def start(self):
+        for stage in self.stages.values():
+            stage.start(f"pipeline-{self.process.process_id}")
+        self.token.on_cancel(self._abort_jobs)
+        logger.info(f"研究过程 {self.process.process_id} 的执行流水线已启动")
+
+    def _abort_jobs(self):
+        """研究取消时立即唤醒所有等待中的步骤"""
+        for job in list(self._jobs):
+            if not job.done.is_set():
+                job.error = ResearchCancelled()
+                job.done.set()
+
+    def shutdown(self):
+        """按数据流顺序停止各阶段，调用前所有步骤应已完成"""
+        for name in STAGE_NAMES:
+            self.stages[name].stop()
+        logger.info(f"研究过程 {self.process.process_id} 的执行流水线已停止")
+
+    def stats(self):
+        stats = {name: self.stages[name].stats() for name in STAGE_NAMES}
+        with self.process.lock:
+            stats["dedup"] = dict(self._dedup_totals)
+        return stats
+
+    def run_step(self, job):
+        """提交一个核心研究问题并等待其完成分析"""
+        job.step_data["query_results"] = job.query_results
+        pending = [idx for idx, result in enumerate(job.query_results) if not result.get("completed")]
+        if len(pending) < len(job.queries):
+            logger.info(f"步骤 '{job.step_title}' 复用检查点中 {len(job.queries) - len(pending)} 个已完成的查询")
+        job.pending_queries = len(pending)
+        self._jobs.append(job)
+        n = 0
+        try:
+            if not pending:
+                self.stages["analyze"].put(job)
+            for n, query_idx in enumerate(pending):
+                self.stages["search"].put((job, query_idx))
+        except ResearchCancelled:
+            self.token.record_skip("search", len(pending) - n)
+            raise
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+
+    def _search(self, item):
+        job, query_idx = item
+        selected = []
+        try:
+            selected = self._run_search(job, query_idx)
+        finally:
+            # 出错时以空结果继续，保证该查询仍会进入小结阶段、步骤能够完成
+            job.selected_results[query_idx] = selected
+            job.pending_fetches[query_idx] = len(selected)
+            if not selected:
+                self.stages["summarize"].put((job, query_idx))
+            for rank in range(len(selected)):
+                self.stages["fetch"].put((job, query_idx, rank))
+
+    def _run_search(self, job, query_idx):
+        """执行一个查询的搜索并记录结果，返回选中深入分析的结果"""
+        process = self.process
+        query = job.queries[query_idx]
+        process.current_step = f"搜索: '{query}' ({job.progress_label}, 查询 {query_idx+1}/{len(job.queries)})"
+        process.emit(EVENT_QUERY_ISSUED, step_index=job.step_index, query=query)
+
+        try:
+            with job.step_slots:
+                search_results = fanout_engine.search(query)
+        except Exception as e:
+            logger.error(f"搜索查询 '{query}' 失败: {str(e)}")
+            search_results = []
+        # 请求期间研究被取消时丢弃结果
+        self.token.raise_if_cancelled()
+        logger.info(f"查询 '{query}' 返回了 {len(search_results)} 个结果")
+
+        query_result = job.query_results[query_idx]
+        for result in search_results:
+            site_info = {
+                "name": result["source"],
+                "url": result["link"],
+                "title": result["title"],
+                "snippet": result["snippet"],
+                "icon": result.get("source_icon", "🔍")
+            }
+
+            # 添加到当前查询的结果中
+            query_result["results"].append(site_info)
+
+            # 添加到步骤的总搜索结果和总的研究网站列表中，同一URL只保留第一次出现的结果
+            with process.lock:
+                job.step_data["search_results"].add(site_info)
+                process.research_sites.add(site_info)
+        process.touch("research_sites", step_index=job.step_index)
+
+        # 每个查询选择3个结果深入分析
+        selected = search_results[:3]
+        # 来自本地语料库的结果带有网页正文，不需要再抓取
+        for result in selected:
+            if result.get("content"):
+                process.source_contents.setdefault(result["link"], result.pop("content"))
+        return selected
+
+    def _fetch(self, item):
+        job, query_idx, rank = item
+        content = ""
+        try:
+            content = self._run_fetch(job, query_idx, rank)
+        finally:
+            # 出错时以空内容继续，保证该结果仍会经过提取阶段减少待处理计数
+            self.stages["extract"].put((job, query_idx, rank, content))
+
+    def _run_fetch(self, job, query_idx, rank):
+        """抓取一个选中结果的网页内容"""
+        process = self.process
+        result = job.selected_results[query_idx][rank]
+        url = result["link"]
+        process.current_step = f"提取内容: {result['source']} ({job.progress_label}, 查询 {query_idx+1})"
+
+        # 同一进程内已抓取过的网页直接复用
+        content = process.source_contents.get(url)
+        if content is None:
+            try:
+                with job.step_slots:
+                    content = fanout_engine.fetch(url)
+            except Exception as e:
+                logger.error(f"获取网页内容时出错: {str(e)}")
+                content = ""
+            self.token.raise_if_cancelled()
+            if content:
+                process.source_contents[url] = content
+            process.emit(EVENT_PAGE_FETCHED, step_index=job.step_index, url=url, source=result["source"],
+                         length=len(content), skipped=search_service.get_skip_reason(url))
+        return content
+
+    def _extract(self, items):
+        try:
+            pages = [(job, query_idx, rank, content) for job, query_idx, rank, content in items if content]
+            key_infos = search_service.extract_key_information_batch([
+                (content, job.queries[query_idx], job.selected_results[query_idx][rank]["link"])
+                for job, query_idx, rank, content in pages
+            ])
+            for (job, query_idx, rank, _), key_info in zip(pages, key_infos):
+                result = job.selected_results[query_idx][rank]
+                if key_info:
+                    # 格式化发现内容，增强可读性
+                    domain = urlparse(result['link']).netloc
+                    job.extracted[query_idx][rank] = f"根据{result['source']}({domain})的数据，{key_info}"
+                else:
+                    logger.warning(f"无法从 {result['source']} 提取有效信息")
+        finally:
+            for job, query_idx, rank, content in items:
+                with job.lock:
+                    job.pending_fetches[query_idx] -= 1
+                    query_done = job.pending_fetches[query_idx] == 0
+                if query_done:
+                    self.stages["summarize"].put((job, query_idx))
+
+    def _summarize(self, item):
+        job, query_idx = item
+        query = job.queries[query_idx]
+        query_result = job.query_results[query_idx]
+        try:
+            # 按结果排名合并该查询的发现
+            extracted = job.extracted[query_idx]
+            extracted_findings = [extracted[rank] for rank in sorted(extracted)]
+            query_result["findings"] = extracted_findings
+
+            if extracted_findings:
+                self.process.current_step = f"生成小结: '{query}' ({job.progress_label})"
+                query_result["summary"] = self.summarize_fn(query, extracted_findings, job.step_title)
+                self.token.raise_if_cancelled()
+                logger.info(f"为查询 '{query}' 生成了小结")
+
+            # 查询级检查点：恢复时该查询的搜索、抓取、提取和小结都不再重复
+            query_result["completed"] = True
+            self.process.touch(step_index=job.step_index)
+            self.process.persist()
+        finally:
+            with job.lock:
+                job.pending_queries -= 1
+                step_done = job.pending_queries == 0
+            if step_done:
+                self.stages["analyze"].put(job)
+
+    def _analyze(self, job):
+        process = self.process
+        step_data = job.step_data
+        try:
+            # 按查询顺序合并发现到步骤和总的研究发现中，近似重复的发现只合并来源。
+            # 步骤分析只使用本步骤去重后的发现，与其他步骤的完成先后无关
+            step_deduplicator = FindingDeduplicator(step_data["findings"])
+            with process.lock:
+                if self._findings is None:
+                    self._findings = FindingDeduplicator(process.research_findings)
+            for query_result in job.query_results:
+                for finding in query_result["findings"]:
+                    if step_deduplicator.add(finding)[1]:
+                        logger.info(f"添加新的研究发现: {finding[:100]}...")
+                    with process.lock:
+                        if self._findings.add(finding)[1]:
+                            process.emit(EVENT_FINDING_ADDED, step_index=job.step_index, finding=finding)
+            with process.lock:
+                self._dedup_totals["duplicates"] += step_deduplicator.duplicates
+                self._dedup_totals["chars_saved"] += step_deduplicator.chars_saved
+            if step_deduplicator.chars_saved:
+                logger.info(f"步骤 '{job.step_title}' 合并了近似重复的发现，分析提示词减少 {step_deduplicator.chars_saved} 字符")
+
+            # 使用LLM分析该步骤的结果
+            if step_data["findings"]:
+                process.current_step = f"分析步骤 {job.step_index+1} 的发现: {job.step_title}"
+                step_data["analysis"] = process.ai_service.analyze_step_findings(
+                    job.step_title,
+                    "\n".join(step_data["findings"])
+                )
+                self.token.raise_if_cancelled()
+            else:
+                # 如果没有发现，也需要添加一个空的分析结果
+                step_data["analysis"] = "未收集到足够的数据进行分析。"
+
+            with process.lock:
+                process.analysis_results.append(f"**{job.step_title}**\n{step_data['analysis']}")
+            process.touch("research_findings", "analysis_results")
+
+            # 标记步骤完成并更新进度
+            process.complete_step(job.step_index)
+        except Exception as e:
+            job.error = e
+        finally:
+            job.done.set()
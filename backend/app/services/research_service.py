@@ -1,23 +1,57 @@
 import os
 import re
+import json
+import hashlib
 import time
 import threading
 import uuid
 import random
 import logging
-from urllib.parse import urlparse
+from functools import partial
 from flask import current_app
 from app.services.siliconflow_service import SiliconFlowService
 from app.services.search_service import search_service
+from app.services.step_executor import step_executor
+from app.services.research_pipeline import ResearchPipeline, StepJob
+from app.services.near_duplicate import deduplicate_findings, finding_list
+from app.services.indexed_list import IndexedList, site_list
+from app.services.job_scheduler import job_scheduler, JOB_PLAN, JOB_EXECUTION
+from app.services.process_store import create_process_store, HOT_FIELDS, BULK_FIELDS, PAGE_FIELD, FINISHED_STATUSES
+from app.services.cancellation import CancellationToken, ResearchCancelled
+from app.services.research_events import (
+    EventBuffer, EVENT_STATUS, EVENT_STEP_STARTED, EVENT_ANALYSIS_DONE, EVENT_REPORT_READY
+)
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 纳入状态版本跟踪的字段，赋值时版本号递增；research_steps另按步骤跟踪
+VERSIONED_FIELDS = [
+    "topic", "requirements", "status", "progress", "plan", "current_step", "current_step_index",
+    "research_sites", "research_findings", "analysis_results", "search_queries", "report", "error",
+    "cancellation"
+]
+
+# 增量响应中总是返回的小字段
+DELTA_ALWAYS_FIELDS = ["status", "progress", "current_step", "current_step_index", "error"]
+
+# 计入ETag的小字段：与版本号一起决定响应是否变化（跨worker读取时热字段可能比检查点更新）
+ETAG_FIELDS = DELTA_ALWAYS_FIELDS + ["cancellation"]
+
+# 按键索引的列表字段：研究网站按URL、研究发现按正文，赋值和从存储加载时转换为IndexedList
+INDEXED_FIELDS = {"research_sites": site_list, "research_findings": finding_list}
+
 class ResearchProcess:
     """研究过程类，用于管理和跟踪研究过程"""
     
-    def __init__(self, topic, requirements):
+    def __init__(self, topic, requirements, process_id=None):
+        self._store = None  # 研究过程存储，热字段赋值时同步写入
+        self.lock = threading.RLock()  # 保护并发执行的步骤对共享列表和进度的修改
+        self._version_changed = threading.Condition(self.lock)  # 状态版本递增时通知长轮询请求
+        self.events = EventBuffer()  # 进度事件，供SSE订阅
+        # 状态版本：总版本号，以及每个字段、每个研究步骤最后一次变化时的版本号
+        self.versions = {"version": 0, "fields": {}, "steps": []}
         self.topic = topic
         self.requirements = requirements
         self.status = "planning"  # planning, researching, analyzing, completed, error
@@ -31,17 +65,153 @@ class ResearchProcess:
         self.search_queries = []  # 存储搜索查询
         self.research_steps = []  # 存储详细的研究步骤及其进度和结果
         self.current_step_index = 0  # 当前执行到的步骤索引
+        self.pipeline = None  # 执行中的研究流水线
+        self.pipeline_stats = None  # 流水线结束时的阶段统计
+        self.cancel_token = CancellationToken()  # 取消时中断进行中的请求
+        self.cancellation = None  # 取消时被跳过的工作统计
         self.report = None
         self.error = None
-        self.process_id = str(int(time.time() * 1000))
+        # 毫秒时间戳加随机后缀，避免多个worker同时创建时ID冲突
+        self.process_id = process_id or f"{int(time.time() * 1000)}{uuid.uuid4().hex[:6]}"
         self.start_time = time.time()
-        self.ai_service = SiliconFlowService()
-        logger.info(f"初始化硅基流动API服务用于研究过程: {self.process_id}")
+        
+    @classmethod
+    def restore(cls, process_id, hot_fields, store):
+        """从存储中恢复研究过程，大字段在首次访问时才加载"""
+        process = cls(hot_fields["topic"], hot_fields["requirements"], process_id=process_id)
+        # 直接写入属性，恢复过程不触发写回存储
+        process.__dict__.update(hot_fields)
+        for field in BULK_FIELDS + [PAGE_FIELD, "events"]:
+            del process.__dict__[field]
+        process.attach_store(store)
+        return process
+        
+    def attach_store(self, store):
+        """关联存储，此后热字段的每次赋值都会写入存储"""
+        self._store = store
+        
+    def __setattr__(self, name, value):
+        # 已取消的研究过程不再被仍在收尾的工作线程改回其他状态
+        if name in ("status", "current_step") and self.__dict__.get("status") == "cancelled":
+            return
+        if name in INDEXED_FIELDS and not isinstance(value, IndexedList):
+            value = INDEXED_FIELDS[name](value)
+        object.__setattr__(self, name, value)
+        if name in VERSIONED_FIELDS or name == "research_steps":
+            self.touch(name)
+        if name == "status":
+            self.emit(EVENT_STATUS, status=value)
+        store = self.__dict__.get("_store")
+        if store is not None and name in HOT_FIELDS:
+            store.update_hot(self.process_id, name, value)
+        
+    def __getattr__(self, name):
+        # 仅在属性不存在时调用：按需创建API服务，从存储中按需加载大字段
+        if name == "ai_service":
+            # 只用于查询状态的恢复对象不会调用模型，首次使用时才创建
+            with self.lock:
+                if name not in self.__dict__:
+                    object.__setattr__(self, name, SiliconFlowService())
+                    logger.info(f"初始化硅基流动API服务用于研究过程: {self.process_id}")
+                return self.__dict__[name]
+        store = self.__dict__.get("_store")
+        if store is not None and name == "events":
+            # 在本节点恢复执行时，事件ID接续存储中已有的事件
+            with self.lock:
+                if name not in self.__dict__:
+                    object.__setattr__(self, name, EventBuffer(last_id=store.last_event_id(self.process_id)))
+                return self.__dict__[name]
+        if store is not None and (name in BULK_FIELDS or name == PAGE_FIELD):
+            # 并发的流水线线程可能同时首次访问，只加载一次，避免其他线程写入的副本被替换
+            with self.lock:
+                if name in self.__dict__:
+                    return self.__dict__[name]
+                value = store.load_bulk(self.process_id, name)
+                if value is None:
+                    value = {} if name == PAGE_FIELD else None if name in ("pipeline_stats", "cancellation") else []
+                    if name == "versions":
+                        value = {"version": 0, "fields": {}, "steps": []}
+                if name in INDEXED_FIELDS:
+                    value = INDEXED_FIELDS[name](value)
+                object.__setattr__(self, name, value)
+                return value
+        raise AttributeError(name)
+        
+    def emit(self, event_type, **data):
+        """发布一条进度事件"""
+        event = self.events.append(event_type, data)
+        if self._store is not None:
+            self._store.append_event(self.process_id, event)
+        
+    def touch(self, *fields, step_index=None):
+        """记录原地修改（列表追加、步骤数据更新等）导致的状态变化，递增版本号"""
+        with self.lock:
+            versions = self.versions
+            versions["version"] += 1
+            version = versions["version"]
+            for field in fields:
+                versions["fields"][field] = version
+            if step_index is not None:
+                steps = versions["steps"]
+                steps.extend([0] * (step_index + 1 - len(steps)))
+                steps[step_index] = version
+            self._version_changed.notify_all()
+        
+    @property
+    def version(self):
+        return self.versions["version"]
+        
+    def wait_for_version(self, version, timeout):
+        """等待状态版本超过version，返回是否在超时前发生了变化"""
+        with self._version_changed:
+            return self._version_changed.wait_for(lambda: self.versions["version"] > version, timeout)
+        
+    def get_etag(self, queue_info=None):
+        """由状态版本号和实时小字段计算ETag"""
+        volatile = {field: getattr(self, field) for field in ETAG_FIELDS}
+        volatile["queue"] = queue_info
+        digest = hashlib.md5(json.dumps(volatile, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+        return f"{self.process_id}-{self.version}-{digest}"
+        
+    def persist(self):
+        """保存检查点：将大字段写入存储"""
+        if self._store is not None:
+            self._store.save_bulk(self)
+        
+    def cancel(self):
+        """取消研究过程：停止调度新的工作，并中断进行中的搜索、抓取和LLM请求"""
+        self.current_step = "研究已取消"
+        self.status = "cancelled"
+        self.cancel_token.cancel()
+        self.cancellation = self.cancel_token.report()
+        
+    def complete_step(self, step_index):
+        """标记步骤完成，并按已完成的步骤数更新进度（线程安全）"""
+        with self.lock:
+            self.research_steps[step_index]["completed"] = True
+            completed = sum(1 for step in self.research_steps if step.get("completed"))
+            self.progress = max(self.progress, 30 + completed * (50 / len(self.research_steps)))
+            self.touch(step_index=step_index)
+            step = self.research_steps[step_index]
+        self.emit(EVENT_ANALYSIS_DONE, step_index=step_index, title=step["title"],
+                  analysis=step.get("analysis"), progress=self.progress)
+        self.persist()
+        
+    def get_pipeline_stats(self):
+        """获取各流水线阶段的队列深度和吞吐量，执行结束后返回最终统计"""
+        pipeline = self.pipeline
+        return pipeline.stats() if pipeline else self.pipeline_stats
+        
+    def get_cancellation_report(self):
+        """获取因取消而跳过的工作统计，本节点执行中的过程返回实时统计"""
+        token = self.cancel_token
+        return token.report() if token.cancelled else self.cancellation
         
     def to_dict(self):
         """将研究过程转换为字典"""
         return {
             "process_id": self.process_id,
+            "version": self.version,
             "topic": self.topic,
             "requirements": self.requirements,
             "status": self.status,
@@ -54,35 +224,279 @@ class ResearchProcess:
             "research_findings": self.research_findings[:15],  # 增加返回的发现数量
             "analysis_results": self.analysis_results,
             "search_queries": self.search_queries[:5],  # 返回的查询数量
+            "pipeline": self.get_pipeline_stats(),  # 流水线各阶段的队列深度和吞吐量
+            "cancellation": self.get_cancellation_report(),  # 取消时被跳过的工作统计
             "report": self.report,
             "error": self.error,
             "elapsed_time": round(time.time() - self.start_time, 2)
         }
+        
+    def to_delta(self, since):
+        """只返回版本号since之后变化的字段和研究步骤
+        
+        research_steps整体被替换时返回完整列表，否则以changed_steps返回{步骤索引: 步骤数据}。
+        """
+        with self.lock:
+            versions = self.versions
+            changed = [field for field in VERSIONED_FIELDS if versions["fields"].get(field, 0) > since]
+            steps_replaced = versions["fields"].get("research_steps", 0) > since
+            changed_steps = [i for i, version in enumerate(versions["steps"]) if version > since]
+            version = versions["version"]
+        
+        full = {
+            "research_findings": self.research_findings[:15],
+            "search_queries": self.search_queries[:5],
+            "cancellation": self.get_cancellation_report(),
+        }
+        delta = {
+            "process_id": self.process_id,
+            "version": version,
+            "since": since,
+            "pipeline": self.get_pipeline_stats(),
+            "elapsed_time": round(time.time() - self.start_time, 2)
+        }
+        for field in DELTA_ALWAYS_FIELDS + changed:
+            delta[field] = full[field] if field in full else getattr(self, field)
+        if steps_replaced:
+            delta["research_steps"] = self.research_steps
+        else:
+            research_steps = self.research_steps
+            delta["changed_steps"] = {i: research_steps[i] for i in changed_steps if i < len(research_steps)}
+        return delta
+
+# 运行中途可能被中断的状态，可以从检查点恢复
+INTERRUPTED_STATUSES = ["planning", "confirmed", "researching", "reporting"]
 
 class ResearchService:
     """研究服务，用于管理所有研究过程"""
     
     def __init__(self):
-        self.research_processes = {}
+        self.research_processes = {}  # 正在本节点排队或执行的研究过程
+        self.store = create_process_store()
+        # 自动恢复开启后，定期扫描执行节点已停止的研究过程的间隔（秒）
+        self.resume_scan_interval = float(os.getenv("RESEARCH_RESUME_SCAN_INTERVAL", 30))
+        # 共享存储时，取消请求可能由其他worker处理，需要轮询存储中的状态
+        self.cancel_poll_interval = float(os.getenv("RESEARCH_CANCEL_POLL_INTERVAL", 1))
+        # 订阅其他worker上执行的研究过程时，轮询存储中新事件的间隔
+        self.event_poll_interval = float(os.getenv("RESEARCH_EVENT_POLL_INTERVAL", 0.5))
+        # 事件流没有新事件时发送心跳的间隔，防止代理断开空闲连接
+        self.stream_keepalive = float(os.getenv("RESEARCH_STREAM_KEEPALIVE", 15))
+        # 长轮询：单次最长等待秒数，以及同时挂起的请求数上限（超过时立即返回，退化为普通轮询）
+        self.longpoll_max_wait = float(os.getenv("RESEARCH_LONGPOLL_MAX_WAIT", 30))
+        self.longpoll_slots = threading.BoundedSemaphore(int(os.getenv("RESEARCH_LONGPOLL_MAX_WAITERS", 64)))
+        if self.store.persistent:
+            # 多个worker共享存储时，并发研究数上限对所有worker合计生效
+            job_scheduler.attach_run_slots(self.store)
+            watcher = threading.Thread(target=self._watch_cancellations, name="research-cancel-watcher")
+            watcher.daemon = True
+            watcher.start()
         # 不再预定义网站列表，而是使用搜索服务来获取真实数据
         logger.info("初始化研究服务，使用真实数据模式")
         
     def create_research_process(self, topic, requirements):
         """创建新的研究过程"""
         research_process = ResearchProcess(topic, requirements)
-        self.research_processes[research_process.process_id] = research_process
+        self.store.add(research_process)
+        research_process.attach_store(self.store)
         self._start_research_thread(research_process)
         return research_process.process_id
         
     def get_research_process(self, process_id):
-        """获取研究过程"""
-        return self.research_processes.get(process_id)
+        """获取研究过程：优先返回本节点正在执行的对象，否则从存储中读取"""
+        return self.research_processes.get(process_id) or self.store.get(process_id)
+        
+    def resume_research(self, process_id):
+        """从检查点恢复中断或出错的研究过程，已完成的步骤和查询结果直接复用
+        
+        Returns:
+            (是否成功, 说明信息)
+        """
+        if process_id in self.research_processes:
+            return False, "研究过程正在本节点执行中"
+        
+        process = self.store.get(process_id)
+        if not process:
+            return False, "未找到指定的研究过程"
+        
+        status = process.status
+        if status not in INTERRUPTED_STATUSES and status != "error":
+            return False, f"研究过程当前状态不允许恢复: {status}"
+        # 执行节点仍在发送心跳时不恢复，避免与仍在执行的节点重复执行
+        owner = self.store.get_owner(process_id)
+        if status != "error" and not self.store.is_orphaned(process_id):
+            return False, "研究过程仍在其他节点执行中"
+        
+        # 计划尚未生成时重新生成计划，否则从检查点继续执行研究
+        next_status = "planning" if not process.plan else "confirmed"
+        if not self.store.claim(process_id, status, next_status, owner):
+            return False, "研究过程已被其他节点恢复"
+        
+        process.status = next_status
+        process.error = None
+        logger.info(f"恢复研究过程: {process_id} (原状态: {status})")
+        if next_status == "planning":
+            self._start_research_thread(process)
+        else:
+            process.current_step = "排队等待恢复研究"
+            self._submit_job(JOB_EXECUTION, process, partial(self._conduct_research, resume=True))
+        return True, "研究过程已恢复执行"
+        
+    def resume_interrupted_processes(self):
+        """恢复存储中所有执行节点已停止的研究过程"""
+        process_ids = self.store.list_processes(INTERRUPTED_STATUSES, orphaned=True)
+        resumed = 0
+        for process_id in process_ids:
+            success, message = self.resume_research(process_id)
+            if success:
+                resumed += 1
+            else:
+                logger.info(f"跳过研究过程 {process_id}: {message}")
+        if process_ids:
+            logger.info(f"恢复了 {resumed} 个被中断的研究过程")
+        return resumed
+        
+    def start_auto_resume(self):
+        """服务启动时恢复被中断的研究过程，并定期重新扫描
+        
+        重启后原worker的心跳要超过RESEARCH_NODE_TIMEOUT才被视为停止，其执行的研究过程由之后的扫描恢复
+        """
+        self.resume_interrupted_processes()
+        if not self.store.persistent:
+            return
+        watcher = threading.Thread(target=self._watch_orphans, name="research-resume-watcher")
+        watcher.daemon = True
+        watcher.start()
+        
+    def _watch_orphans(self):
+        while True:
+            time.sleep(self.resume_scan_interval)
+            try:
+                self.resume_interrupted_processes()
+            except Exception as e:
+                logger.error(f"扫描被中断的研究过程时出错: {str(e)}")
+        
+    def cancel_research(self, process_id):
+        """取消研究过程：移除排队中的任务并中断正在执行的工作
+        
+        Returns:
+            被取消的研究过程，不存在时返回None
+        """
+        process = self.get_research_process(process_id)
+        if not process:
+            return None
+        
+        removed = job_scheduler.cancel(process_id)
+        if removed:
+            process.cancel_token.record_skip("queued_jobs", removed)
+            self.research_processes.pop(process_id, None)
+        process.cancel()
+        process.persist()
+        logger.info(f"研究过程已取消: {process_id}, 跳过的工作: {process.cancellation}")
+        return process
+        
+    def _watch_cancellations(self):
+        """轮询存储，中断在本节点执行、但已由其他worker标记为取消的研究过程"""
+        while True:
+            time.sleep(self.cancel_poll_interval)
+            for process_id, process in list(self.research_processes.items()):
+                try:
+                    if process.status != "cancelled" and self.store.get_status(process_id) == "cancelled":
+                        logger.info(f"检测到研究过程已在其他节点取消: {process_id}")
+                        self.cancel_research(process_id)
+                except Exception as e:
+                    logger.error(f"检查研究过程取消状态时出错: {str(e)}")
+        
+    def wait_for_events(self, process, last_id, timeout):
+        """等待研究过程ID大于last_id的进度事件
+        
+        Returns:
+            (事件列表, 是否有事件已被淘汰)，超时时事件列表为空
+        """
+        process_id = process.process_id
+        local = self.research_processes.get(process_id)
+        if local is not None or not self.store.persistent:
+            # 本节点上的研究过程：等待执行中对象的内存缓冲区通知
+            events, truncated = (local or process).events.wait(last_id, timeout)
+            if truncated and self.store.persistent:
+                # 在本节点恢复执行前的事件只保存在共享存储中
+                return self.store.events_since(process_id, last_id)
+            return events, truncated
+        
+        # 在其他worker上执行：轮询共享存储
+        deadline = time.time() + timeout
+        while True:
+            events, truncated = self.store.events_since(process_id, last_id)
+            remaining = deadline - time.time()
+            if events or truncated or remaining <= 0:
+                return events, truncated
+            time.sleep(min(self.event_poll_interval, remaining))
+        
+    def wait_for_version(self, process, version, timeout):
+        """长轮询：等待研究过程的状态版本超过version或超时，返回最新的研究过程对象
+        
+        本节点执行的过程在版本条件变量上休眠，不占用CPU；在其他worker上执行的过程
+        按固定间隔读取存储中检查点的版本号。
+        """
+        process_id = process.process_id
+        timeout = min(timeout, self.longpoll_max_wait)
+        if timeout <= 0 or not self.longpoll_slots.acquire(blocking=False):
+            return process
+        try:
+            local = self.research_processes.get(process_id)
+            if local is not None or not self.store.persistent:
+                local = local or process
+                local.wait_for_version(version, timeout)
+                return local
+            
+            deadline = time.time() + timeout
+            while True:
+                versions = self.store.load_bulk(process_id, "versions")
+                remaining = deadline - time.time()
+                if (versions and versions["version"] > version) or remaining <= 0:
+                    break
+                time.sleep(min(self.event_poll_interval, remaining))
+            return self.get_research_process(process_id)
+        finally:
+            self.longpoll_slots.release()
+        
+    def get_queue_info(self, process_id):
+        """获取研究过程在全局调度队列中的位置和预计开始时间"""
+        return job_scheduler.get_queue_info(process_id)
+        
+    def get_scheduler_stats(self):
+        """获取全局调度器和网页抓取调度器的运行状态"""
+        stats = job_scheduler.stats()
+        stats["fetch"] = search_service.fetch_scheduler.stats()
+        stats["fetch"]["downloads"] = search_service.get_download_stats()
+        stats["extraction"] = search_service.extraction_pool.stats()
+        return stats
+        
+    def get_cache_stats(self):
+        """获取搜索服务各级缓存的命中统计"""
+        return search_service.get_cache_stats()
         
     def _start_research_thread(self, research_process):
-        """启动研究计划生成线程，只负责生成计划，不执行完整研究"""
-        thread = threading.Thread(target=self._generate_research_plan, args=(research_process,))
-        thread.daemon = True
-        thread.start()
+        """提交研究计划生成任务到全局调度器，只负责生成计划，不执行完整研究"""
+        research_process.current_step = "排队等待生成研究计划"
+        self._submit_job(JOB_PLAN, research_process, self._generate_research_plan)
+        
+    def _submit_job(self, job_type, process, target):
+        """提交任务到全局调度器，任务完成前研究过程保留在本节点"""
+        self.research_processes[process.process_id] = process
+        job_scheduler.submit(job_type, process.process_id, partial(self._run_job, process, target))
+        
+    def _run_job(self, process, target):
+        token = process.cancel_token
+        try:
+            # 任务线程发出的LLM请求关联到该研究过程，取消时可被中断
+            with token.activate():
+                target(process)
+        finally:
+            if token.cancelled:
+                process.cancellation = token.report()
+            # 保存最终状态，之后的请求从存储中读取该研究过程
+            process.persist()
+            self.research_processes.pop(process.process_id, None)
         
     def _generate_research_plan(self, process):
         """只生成研究计划，不执行完整研究过程"""
@@ -95,8 +509,11 @@ class ResearchService:
                 process.plan = process.ai_service.generate_research_plan(
                     process.topic, process.requirements
                 )
+                process.cancel_token.raise_if_cancelled()
                 logger.info("研究计划生成成功")
                 process.progress = 20
+            except ResearchCancelled:
+                raise
             except Exception as e:
                 logger.error(f"生成研究计划时出错: {str(e)}")
                 process.error = f"生成研究计划时出错: {str(e)}"
@@ -109,253 +526,63 @@ class ResearchService:
             
             # 后续的研究执行步骤将在用户确认后通过start_research_execution触发
             
+        except ResearchCancelled:
+            logger.info(f"研究计划生成已取消: {process.process_id}")
         except Exception as e:
             process.error = f"生成研究计划过程中出错: {str(e)}"
             process.status = "error"
         
-    def _conduct_research(self, process):
+    def _conduct_research(self, process, resume=False):
         """按照研究计划的每个步骤执行研究（仅在用户确认计划后进行）
         优化版流程：专注于核心研究问题的专门检索和分析
+        
+        Args:
+            process: 研究过程
+            resume: 是否从检查点恢复，恢复时跳过已完成的步骤和查询
         """
         try:
-            # 确保当前状态正确 - 允许confirmed或waiting_confirmation状态
-            if process.status != "confirmed" and process.status != "waiting_confirmation":
-                logger.error(f"状态错误，无法执行研究: {process.status}")
-                return
-                
-            logger.info(f"用户已确认研究计划，开始执行研究: {process.process_id}")
-            
-            # 1. 解析研究计划中的步骤，优化版本专注于研究问题
-            research_steps = self._parse_research_plan(process.plan, prioritize_questions=True)
-            total_steps = len(research_steps)
-            
-            # 初始化研究步骤数据结构
-            process.research_steps = [
-                {
-                    "title": step["title"],
-                    "description": step["description"],
-                    "is_core_question": step.get("is_core_question", False),  # 新增属性，标记是否为核心研究问题
-                    "completed": False,
-                    "search_results": [],
-                    "findings": [],
-                    "analysis": None
-                }
-                for step in research_steps
-            ]
-            
-            # 更新状态为研究中
-            process.status = "researching"
-            process.progress = 30
-            
-            # 2. 区分核心研究问题和其他步骤
-            core_research_steps = []
-            knowledge_steps = []  # 研究目标和研究方法等知识性步骤
-            
-            for i, step in enumerate(research_steps):
-                step_title = step["title"]
-                step_description = step["description"]
-                is_core_question = False
-                
-                # 使用更精确的检测方法判断步骤类型
-                if step.get("is_core_question", False) or \
-                   ("核心" in step_title and "问题" in step_title) or \
-                   ("研究问题" in step_title) or \
-                   ("关键问题" in step_title) or \
-                   any(q in step_title.lower() for q in ["问题", "question", "inquiry", "探究"]):
-                    is_core_question = True
-                    step["is_core_question"] = True  # 更新步骤属性
-                    process.research_steps[i]["is_core_question"] = True  # 保持同步
-                    core_research_steps.append(i)
-                elif ("研究目标" in step_title) or ("研究方法" in step_title) or \
-                     ("研究背景" in step_title) or ("研究范围" in step_title):
-                    knowledge_steps.append(i)
-                    # 将这些步骤标记为知识性步骤
-                    step["is_knowledge_step"] = True
-                    process.research_steps[i]["is_knowledge_step"] = True
-                else:
-                    # 其他实质性分析步骤也视为核心
-                    core_research_steps.append(i)
-                
-                logger.info(f"步骤 {i+1}: {step_title} - {'核心研究问题' if is_core_question else '知识性步骤' if i in knowledge_steps else '分析步骤'} (优先级: {len(core_research_steps)})")
-                
-                # 初始化步骤数据中的原始内容
-                process.research_steps[i]["original_content"] = step.get("original_content", "")  # 保存原始内容
+            if resume and process.research_steps:
+                # 从检查点恢复：沿用已保存的步骤，只执行尚未完成的部分
+                logger.info(f"从检查点恢复研究: {process.process_id}")
+                knowledge_steps = [i for i, step in enumerate(process.research_steps) if step.get("is_knowledge_step")]
+                core_research_steps = [i for i, step in enumerate(process.research_steps) if not step.get("is_knowledge_step")]
+                process.status = "researching"
+            else:
+                prepared = self._prepare_research_steps(process)
+                if prepared is None:
+                    return
+                knowledge_steps, core_research_steps = prepared
+            total_steps = len(process.research_steps)
             
-            # 优化研究流程 - 按不同类型处理步骤并保留完整过程
+            # 优化研究流程 - 知识性步骤与核心研究问题互不依赖，交由步骤执行器并发处理
+            logger.info(f"开始并发处理研究步骤: 知识性步骤 {len(knowledge_steps)} 个, 核心研究问题 {len(core_research_steps)} 个")
             
-            # 先处理知识性步骤(研究目标等)
+            tasks = []
             for i in knowledge_steps:
-                step = research_steps[i]
-                step_title = step["title"]
-                step_description = step["description"]
-                
-                process.current_step = f"生成知识性内容: {step_title} ({i+1}/{total_steps})"
-                logger.info(f"开始处理知识性步骤 {i+1}/{total_steps}: {step_title}")
-                
-                # 更新当前步骤索引
-                process.current_step_index = i
-                current_step_data = process.research_steps[i]
-                
-                # 使用AI直接生成概述，而非执行搜索
-                from app.services.siliconflow_service import siliconflow_service
-                
-                analysis = siliconflow_service.create_knowledge_content(
-                    step_title,
-                    step_description,
-                    process.topic,
-                    process.plan
-                )
-                
-                current_step_data["analysis"] = analysis
-                logger.info(f"生成了知识性步骤 '{step_title}' 的内容")
-                current_step_data["completed"] = True
-                
-                # 更新进度
-                progress_increment = 10 / len(knowledge_steps) if len(knowledge_steps) > 0 else 0
-                process.progress = 30 + progress_increment
+                if not process.research_steps[i]["completed"]:
+                    tasks.append((i, partial(self._run_knowledge_step, process, process.research_steps[i], i, total_steps)))
+            for idx, i in enumerate(core_research_steps):
+                if not process.research_steps[i]["completed"]:
+                    tasks.append((i, partial(self._run_core_step, process, process.research_steps[i], i, idx, len(core_research_steps))))
             
-            # 处理核心研究问题 - 每个问题单独搜索并生成分析
-            logger.info(f"开始处理核心研究问题，共 {len(core_research_steps)} 个问题")
+            # 核心研究问题共享一条流水线，不同问题的搜索、抓取和分析阶段相互重叠
+            process.pipeline = ResearchPipeline(process, self._generate_query_summary)
+            process.pipeline.start()
+            try:
+                step_executor.run(process, tasks)
+            finally:
+                process.pipeline.shutdown()
+                process.pipeline_stats = process.pipeline.stats()
+                process.pipeline = None
             
-            for idx, i in enumerate(core_research_steps):
-                step = research_steps[i]
-                step_title = step["title"]
-                step_description = step["description"]
-                
-                process.current_step = f"研究问题: {step_title} ({idx+1}/{len(core_research_steps)})"
-                logger.info(f"开始执行核心研究问题 {idx+1}/{len(core_research_steps)}: {step_title}")
-                
-                # 更新当前步骤索引
-                process.current_step_index = i
-                current_step_data = process.research_steps[i]
-                current_step_data["step_number"] = i+1  # 保存步骤编号
-                current_step_data["search_queries"] = []  # 初始化步骤的搜索查询列表
-                step_findings = []
-                
-                # 生成当前研究问题的搜索查询
-                search_queries = self._generate_step_search_queries(step_title, step_description, process.topic)
-                logger.info(f"为核心研究问题 '{step_title}' 生成了 {len(search_queries)} 个搜索查询")
-                
-                # 存储步骤的搜索查询，便于前端展示
-                current_step_data["search_queries"] = search_queries
-                
-                # 添加到总查询列表中
-                process.search_queries.extend(search_queries)
-                
-                # 对每个查询执行搜索
-                for query_idx, query in enumerate(search_queries):
-                    process.current_step = f"搜索: '{query}' (问题 {idx+1}/{len(core_research_steps)}, 查询 {query_idx+1}/{len(search_queries)})"
-                    logger.info(f"执行搜索查询 {query_idx+1}/{len(search_queries)}: {query}")
-                    
-                    # 调用搜索服务
-                    search_results = search_service.search(query)
-                    logger.info(f"查询 '{query}' 返回了 {len(search_results)} 个结果")
-                    
-                    # 为查询创建结果结构
-                    query_result = {
-                        "query": query,
-                        "results": [],
-                        "findings": []
-                    }
-                    
-                    # 处理搜索结果
-                    for result in search_results:
-                        site_info = {
-                            "name": result["source"],
-                            "url": result["link"],
-                            "title": result["title"],
-                            "snippet": result["snippet"],
-                            "icon": result.get("source_icon", "🔍")
-                        }
-                        
-                        # 添加到当前查询的结果中
-                        query_result["results"].append(site_info)
-                        
-                        # 添加到步骤的总搜索结果中
-                        if site_info not in current_step_data["search_results"]:
-                            current_step_data["search_results"].append(site_info)
-                        
-                        # 同时添加到总的研究网站列表中
-                        if site_info not in process.research_sites:
-                            process.research_sites.append(site_info)
-                    
-                    # 从搜索结果提取内容
-                    extracted_findings = []
-                    for result_idx, result in enumerate(search_results[:3]):  # 每个查询选择3个结果深入分析
-                        try:
-                            url = result["link"]
-                            process.current_step = f"提取内容: {result['source']} (问题 {idx+1}, 查询 {query_idx+1})"
-                            
-                            # 获取网页内容
-                            content = search_service.fetch_content(url)
-                            if not content:
-                                continue
-                                
-                            # 存储网页内容
-                            process.source_contents[url] = content
-                            
-                            # 提取相关信息
-                            key_info = search_service.extract_key_information(content, query)
-                        
-                            # 只有当key_info有效且不为None时才创建发现
-                            if key_info:
-                                # 格式化发现内容，增强可读性
-                                domain = urlparse(result['link']).netloc
-                                finding = f"根据{result['source']}({domain})的数据，{key_info}"
-                                
-                                # 添加到当前查询的发现中
-                                query_result["findings"].append(finding)
-                                extracted_findings.append(finding)
-                                
-                                # 添加到步骤的发现中
-                                if finding not in current_step_data["findings"]:
-                                    current_step_data["findings"].append(finding)
-                                    logger.info(f"添加新的研究发现: {finding[:100]}...")
-                                    
-                                # 同时添加到总的研究发现中
-                                if finding not in process.research_findings:
-                                    process.research_findings.append(finding)
-                                    step_findings.append(finding)
-                            else:
-                                logger.warning(f"无法从 {result['source']} 提取有效信息")
-                        except Exception as e:
-                            logger.error(f"获取网页内容时出错: {str(e)}")
-                    
-                    # 将当前查询的结果存储到步骤中
-                    if not hasattr(current_step_data, "query_results"):
-                        current_step_data["query_results"] = []
-                    current_step_data["query_results"].append(query_result)
-                    
-                    # 为当前查询生成小结
-                    if extracted_findings:
-                        query_summary = self._generate_query_summary(query, extracted_findings, step_title)
-                        query_result["summary"] = query_summary
-                        logger.info(f"为查询 '{query}' 生成了小结")
-
-                
-                # 使用LLM分析该步骤的结果
-                if step_findings:
-                    process.current_step = f"分析步骤 {i+1} 的发现: {step_title}"
-                    step_analysis = process.ai_service.analyze_step_findings(
-                        step_title, 
-                        "\n".join(step_findings)
-                    )
-                    
-                    # 保存分析结果
-                    current_step_data["analysis"] = step_analysis
-                    process.analysis_results.append(f"**{step_title}**\n{step_analysis}")
-                else:
-                    # 如果没有发现，也需要添加一个空的分析结果
-                    current_step_data["analysis"] = "未收集到足够的数据进行分析。"
-                    process.analysis_results.append(f"**{step_title}**\n未收集到足够的数据进行分析。")
-                
-                # 标记步骤完成
-                current_step_data["completed"] = True
-                
-                # 更新进度
-                process.progress = 30 + (i+1) * (50 / total_steps)
+            # 按计划顺序汇总核心步骤的分析结果，保证与完成先后无关
+            process.analysis_results = [
+                f"**{process.research_steps[i]['title']}**\n{process.research_steps[i]['analysis']}"
+                for i in core_research_steps
+            ]
             
             # 3. 生成报告阶段
+            process.cancel_token.raise_if_cancelled()
             process.status = "reporting"
             process.current_step = "生成研究报告"
             process.progress = 90
@@ -549,11 +776,12 @@ class ResearchService:
                                             if line.strip().startswith('- ') and len(line) > 5]
                         all_findings.extend(extracted_findings)
                     
-                    # 确保研究发现不重复
-                    unique_findings = list(dict.fromkeys(all_findings))
+                    # 确保研究发现不重复，近似重复的发现合并来源
+                    unique_findings, dedup_stats = deduplicate_findings(all_findings)
                     
                     # 记录研究发现数量
-                    logger.info(f"为研究报告准备了 {len(unique_findings)} 条研究发现")
+                    logger.info(f"为研究报告准备了 {len(unique_findings)} 条研究发现，"
+                                f"合并近似重复 {dedup_stats['duplicates']} 条，减少 {dedup_stats['chars_saved']} 字符")
                     
                     # 尝试通过AI服务生成研究报告，使用正确的方法和参数
                     process.report = process.ai_service.analyze_research_report(
@@ -574,20 +802,162 @@ class ResearchService:
                         process.research_steps
                     )
                     logger.info("使用备用方案生成报告成功")
+                process.emit(EVENT_REPORT_READY, length=len(process.report or ""))
                 
                 # 完成研究
+                process.cancel_token.raise_if_cancelled()
                 process.progress = 100
                 process.status = "completed"
                 process.current_step = "研究完成"
+            except ResearchCancelled:
+                raise
             except Exception as e:
                 logger.error(f"生成研究报告时出错: {str(e)}")
                 process.error = f"生成研究报告时出错: {str(e)}"
                 process.status = "error"
             
+        except ResearchCancelled:
+            logger.info(f"研究过程已取消: {process.process_id}")
         except Exception as e:
             process.error = f"研究过程中出错: {str(e)}"
             process.status = "error"
     
+    def _prepare_research_steps(self, process):
+        """解析研究计划并初始化研究步骤数据结构
+        
+        Returns:
+            (知识性步骤索引列表, 核心研究问题索引列表)，状态不允许执行时返回None
+        """
+        # 确保当前状态正确 - 允许confirmed或waiting_confirmation状态
+        if process.status != "confirmed" and process.status != "waiting_confirmation":
+            logger.error(f"状态错误，无法执行研究: {process.status}")
+            return None
+            
+        logger.info(f"用户已确认研究计划，开始执行研究: {process.process_id}")
+        
+        # 1. 解析研究计划中的步骤，优化版本专注于研究问题
+        research_steps = self._parse_research_plan(process.plan, prioritize_questions=True)
+        total_steps = len(research_steps)
+        
+        # 初始化研究步骤数据结构
+        process.research_steps = [
+            {
+                "title": step["title"],
+                "description": step["description"],
+                "is_core_question": step.get("is_core_question", False),  # 新增属性，标记是否为核心研究问题
+                "completed": False,
+                "search_results": [],
+                "findings": [],
+                "analysis": None
+            }
+            for step in research_steps
+        ]
+        
+        # 更新状态为研究中
+        process.status = "researching"
+        process.progress = 30
+        
+        # 2. 区分核心研究问题和其他步骤
+        core_research_steps = []
+        knowledge_steps = []  # 研究目标和研究方法等知识性步骤
+        
+        for i, step in enumerate(research_steps):
+            step_title = step["title"]
+            step_description = step["description"]
+            is_core_question = False
+            
+            # 使用更精确的检测方法判断步骤类型
+            if step.get("is_core_question", False) or \
+               ("核心" in step_title and "问题" in step_title) or \
+               ("研究问题" in step_title) or \
+               ("关键问题" in step_title) or \
+               any(q in step_title.lower() for q in ["问题", "question", "inquiry", "探究"]):
+                is_core_question = True
+                step["is_core_question"] = True  # 更新步骤属性
+                process.research_steps[i]["is_core_question"] = True  # 保持同步
+                core_research_steps.append(i)
+            elif ("研究目标" in step_title) or ("研究方法" in step_title) or \
+                 ("研究背景" in step_title) or ("研究范围" in step_title):
+                knowledge_steps.append(i)
+                # 将这些步骤标记为知识性步骤
+                step["is_knowledge_step"] = True
+                process.research_steps[i]["is_knowledge_step"] = True
+            else:
+                # 其他实质性分析步骤也视为核心
+                core_research_steps.append(i)
+            
+            logger.info(f"步骤 {i+1}: {step_title} - {'核心研究问题' if is_core_question else '知识性步骤' if i in knowledge_steps else '分析步骤'} (优先级: {len(core_research_steps)})")
+            
+            # 初始化步骤数据中的原始内容
+            process.research_steps[i]["original_content"] = step.get("original_content", "")  # 保存原始内容
+        process.touch("research_steps")
+        
+        # 保存初始检查点，中断后可据此恢复
+        process.persist()
+        
+        return knowledge_steps, core_research_steps
+    
+    def _run_knowledge_step(self, process, step, i, total_steps):
+        """处理单个知识性步骤(研究目标等)，使用AI直接生成概述，而非执行搜索"""
+        step_title = step["title"]
+        step_description = step["description"]
+        
+        process.current_step = f"生成知识性内容: {step_title} ({i+1}/{total_steps})"
+        logger.info(f"开始处理知识性步骤 {i+1}/{total_steps}: {step_title}")
+        process.emit(EVENT_STEP_STARTED, step_index=i, title=step_title, kind="knowledge")
+        
+        # 更新当前步骤索引
+        process.current_step_index = i
+        current_step_data = process.research_steps[i]
+        
+        from app.services.siliconflow_service import siliconflow_service
+        
+        analysis = siliconflow_service.create_knowledge_content(
+            step_title,
+            step_description,
+            process.topic,
+            process.plan
+        )
+        
+        current_step_data["analysis"] = analysis
+        logger.info(f"生成了知识性步骤 '{step_title}' 的内容")
+        
+        # 标记步骤完成并更新进度
+        process.complete_step(i)
+    
+    def _run_core_step(self, process, step, i, idx, total_core_steps):
+        """处理单个核心研究问题 - 单独搜索并生成分析"""
+        step_title = step["title"]
+        step_description = step["description"]
+        
+        process.current_step = f"研究问题: {step_title} ({idx+1}/{total_core_steps})"
+        logger.info(f"开始执行核心研究问题 {idx+1}/{total_core_steps}: {step_title}")
+        process.emit(EVENT_STEP_STARTED, step_index=i, title=step_title, kind="core")
+        
+        # 更新当前步骤索引
+        process.current_step_index = i
+        current_step_data = process.research_steps[i]
+        current_step_data["step_number"] = i+1  # 保存步骤编号
+        
+        # 从检查点恢复时沿用已生成的查询，否则生成当前研究问题的搜索查询
+        search_queries = current_step_data.get("search_queries")
+        if not search_queries:
+            search_queries = self._generate_step_search_queries(step_title, step_description, process.topic)
+            logger.info(f"为核心研究问题 '{step_title}' 生成了 {len(search_queries)} 个搜索查询")
+            
+            # 存储步骤的搜索查询，便于前端展示
+            current_step_data["search_queries"] = search_queries
+            
+            # 添加到总查询列表中
+            with process.lock:
+                process.search_queries.extend(search_queries)
+            process.touch("search_queries", step_index=i)
+        
+        # 交由执行流水线完成搜索、抓取、提取、小结和步骤分析，已完成的查询结果直接复用
+        job = StepJob(i, step_title, search_queries, current_step_data, f"问题 {idx+1}/{total_core_steps}",
+                      previous_results=current_step_data.get("query_results"))
+        process.pipeline.run_step(job)
+    
     def _generate_fallback_report(self, topic, requirements, findings, research_steps):
         """生成备用研究报告，当AI服务无法生成报告时使用
         
@@ -722,15 +1092,17 @@ class ResearchService:
             logger.error(f"研究进程状态不正确，无法执行: {process.status}")
             return False
             
-        # 更新状态，表明用户已确认研究计划
+        # 原子地确认研究计划并由本节点接管执行，防止多个worker重复确认和执行同一研究过程
+        if not self.store.claim(process_id, "waiting_confirmation", "confirmed"):
+            logger.error(f"研究计划已被确认或状态已改变，无法执行: {process_id}")
+            return False
         process.status = "confirmed"
         logger.info(f"研究计划已被用户确认: {process_id}")
         
-        # 启动一个新线程来执行研究
-        logger.info(f"开始执行研究过程: {process_id}")
-        thread = threading.Thread(target=self._conduct_research, args=(process,))
-        thread.daemon = True
-        thread.start()
+        # 提交研究执行任务到全局调度器，由固定数量的工作线程执行
+        logger.info(f"研究执行任务已提交: {process_id}")
+        process.current_step = "排队等待执行研究"
+        self._submit_job(JOB_EXECUTION, process, self._conduct_research)
         return True
     
     def _parse_research_plan(self, plan, prioritize_questions=False):
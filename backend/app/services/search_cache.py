@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 各搜索引擎默认的结果缓存时间（秒），可通过 SEARCH_CACHE_TTL_<ENGINE> 覆盖
+DEFAULT_ENGINE_TTLS = {"google": 24 * 3600, "duckduckgo": 6 * 3600}
+
+# 空结果的缓存时间（秒），避免反复请求没有结果的查询
+DEFAULT_NEGATIVE_TTL = 600
+
+def normalize_query(query):
+    """查询的缓存形式：忽略大小写和多余空白"""
+    return " ".join(query.lower().split())
+
+def _engine_ttl(engine):
+    return float(os.getenv(f"SEARCH_CACHE_TTL_{engine.upper()}", DEFAULT_ENGINE_TTLS.get(engine, 3600)))
+
+class SearchCache:
+    """搜索结果缓存：内存LRU + SQLite磁盘两级
+
+    键由规范化后的查询、搜索引擎、语言和结果数量组成。内存层未命中时查询磁盘层，
+    命中后提升到内存层；多个worker共享同一个磁盘缓存文件。
+    """
+
+    def __init__(self, memory_size=None, path=None, negative_ttl=None):
+        self.memory_size = memory_size or int(os.getenv("SEARCH_CACHE_MEMORY_SIZE", 1000))
+        self.negative_ttl = negative_ttl or float(os.getenv("SEARCH_CACHE_NEGATIVE_TTL", DEFAULT_NEGATIVE_TTL))
+        self.ttls = {}
+        self._memory = OrderedDict()   # key -> (过期时间, 结果列表)
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0, "disk_hits": 0, "negative_hits": 0,
+            "misses": 0, "stores": 0, "negative_stores": 0, "evictions": 0
+        }
+
+        self._conn = None
+        self._puts = 0
+        if os.getenv("SEARCH_CACHE_DISK", "true").lower() == "true":
+            self.path = path or os.getenv("SEARCH_CACHE_PATH", "search_cache.db")
+            try:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                with self._conn:
+                    self._conn.execute(
+                        "CREATE TABLE IF NOT EXISTS search_cache "
+                        "(key TEXT PRIMARY KEY, engine TEXT, query TEXT, results TEXT, expires_at REAL)"
+                    )
+                self._purge_expired()
+            except Exception as e:
+                logger.warning(f"无法打开搜索缓存文件 {self.path}，仅使用内存缓存: {str(e)}")
+                self._conn = None
+        logger.info(f"初始化搜索缓存，内存容量: {self.memory_size}, 磁盘缓存: {'开启' if self._conn else '关闭'}")
+
+    def ttl(self, engine):
+        if engine not in self.ttls:
+            self.ttls[engine] = _engine_ttl(engine)
+        return self.ttls[engine]
+
+    def make_key(self, engine, query, language, num_results):
+        raw = json.dumps([engine, normalize_query(query), language, num_results], ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """查找缓存，未命中或已过期时返回None，命中时返回结果副本"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self._count_hit("memory_hits", entry[1])
+                return [dict(result) for result in entry[1]]
+            if entry is not None:
+                del self._memory[key]
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT results, expires_at FROM search_cache WHERE key = ? AND expires_at > ?", (key, now)
+                    ).fetchone()
+                except Exception as e:
+                    logger.warning(f"读取搜索缓存失败: {str(e)}")
+                    row = None
+                if row is not None:
+                    results = json.loads(row[0])
+                    self._remember(key, row[1], results)
+                    self._count_hit("disk_hits", results)
+                    return [dict(result) for result in results]
+
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key, engine, query, results):
+        """保存搜索结果；空结果使用较短的负缓存时间"""
+        ttl = self.ttl(engine) if results else self.negative_ttl
+        expires_at = time.time() + ttl
+        results = [dict(result) for result in results]
+        with self._lock:
+            self._remember(key, expires_at, results)
+            self._counters["stores" if results else "negative_stores"] += 1
+            if self._conn is None:
+                return
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO search_cache (key, engine, query, results, expires_at) VALUES (?, ?, ?, ?, ?)",
+                        (key, engine, normalize_query(query), json.dumps(results, ensure_ascii=False), expires_at)
+                    )
+                self._puts += 1
+                if self._puts % 500 == 0:
+                    self._purge_expired()
+            except Exception as e:
+                logger.warning(f"写入搜索缓存失败: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self._counters[k] for k in ("memory_hits", "disk_hits", "misses"))
+            hits = lookups - self._counters["misses"]
+            return dict(
+                self._counters,
+                memory_entries=len(self._memory),
+                hit_rate=round(hits / lookups, 3) if lookups else 0.0
+            )
+
+    def _remember(self, key, expires_at, results):
+        self._memory[key] = (expires_at, results)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _count_hit(self, tier, results):
+        self._counters[tier] += 1
+        if not results:
+            self._counters["negative_hits"] += 1
+
+    def _purge_expired(self):
+        with self._conn:
+            self._conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time(),))
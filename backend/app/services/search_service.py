@@ -4,51 +4,33 @@ import json
 import time
 import re
 import html
-import os
-from bs4 import BeautifulSoup
 from serpapi.google_search import GoogleSearch
 from datetime import datetime
-import nltk
-from nltk.tokenize import sent_tokenize
 from urllib.parse import urlparse
+import codecs
 import logging
+import threading
+from collections import OrderedDict
+from app.services.cancellation import CancellableHTTPAdapter
+from app.services.html_extractors import BufferedSession, get_extractor
+from app.services.charset_sniffer import sniff_charset, PROBE_BYTES
+from app.services.query_matcher import QueryMatcherCache
+from app.services.related_terms import get_related_terms
+from app.services.sentence_splitter import get_sentence_splitter
+from app.services.document_analysis import DocumentAnalysisCache, extract_key_information
+from app.services.extraction_pool import ExtractionPool
+from app.services.search_cache import SearchCache, normalize_query
+from app.services.page_cache import PageCache
+from app.services.local_corpus import LocalCorpus
+from app.services.single_flight import SingleFlight
+from app.services.fetch_scheduler import FetchScheduler, FetchWaitTimeout
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# 尝试下载NLTK数据
-nltk_data_downloaded = False
-
-def ensure_nltk_data():
-    """
-    确保NLTK数据已下载，设置下载路径为当前目录
-    """
-    global nltk_data_downloaded
-    
-    if nltk_data_downloaded:
-        return
-        
-    try:
-        # 设置下载目录
-        import os
-        nltk_data_path = os.path.join(os.getcwd(), 'nltk_data')
-        os.makedirs(nltk_data_path, exist_ok=True)
-        nltk.data.path.append(nltk_data_path)
-        
-        # 下载数据
-        logger.info(f"正在下载NLTK punkt数据到 {nltk_data_path}")
-        nltk.download('punkt', download_dir=nltk_data_path, quiet=False)
-        nltk_data_downloaded = True
-        logger.info("NLTK数据下载成功")
-    except Exception as e:
-        logger.warning(f"无法下载NLTK数据: {str(e)}")
-
-# 初始化时尝试下载
-try:
-    ensure_nltk_data()
-except Exception as e:
-    logger.warning(f"初始化NLTK数据时出错: {str(e)}")
+# 可以提取正文的响应类型
+TEXT_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain", "application/xml", "text/xml"}
 
 class SearchService:
     """真实搜索服务，使用SerpAPI和网页爬取来获取真实数据"""
@@ -63,8 +45,47 @@ class SearchService:
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        # 研究取消时可中断进行中的网页抓取
+        self.session.mount('http://', CancellableHTTPAdapter())
+        self.session.mount('https://', CancellableHTTPAdapter())
+        # 搜索结果缓存，相同的查询在有效期内不再请求搜索引擎
+        self.search_cache = SearchCache()
+        # 网页正文缓存，过期后通过条件请求重新验证
+        self.page_cache = PageCache()
+        # 本地语料库：保存抓取过的网页正文，作为外部搜索之前的第一级搜索来源
+        self.local_corpus = LocalCorpus()
+        self._result_titles = OrderedDict()  # url -> 外部搜索结果中的标题，写入语料库时使用
+        # 合并并发的重复搜索和网页抓取（同一步骤的多个查询、多个研究过程可能同时请求同一URL）
+        self.search_flight = SingleFlight("search")
+        self.fetch_flight = SingleFlight("fetch")
+        # 网页抓取按主机限制并发和速率，每个主机使用独立的连接池
+        self.fetch_scheduler = FetchScheduler(headers=self.session.headers)
+        # 单个网页最多下载的字节数，超出部分不再下载
+        self.html_extractor = get_extractor()
+        self.sentence_splitter = get_sentence_splitter()
+        self.document_cache = DocumentAnalysisCache(self.sentence_splitter)
+        self.max_page_bytes = int(os.getenv("FETCH_MAX_PAGE_BYTES", 2 * 1024 * 1024))
+        self.download_stats = {
+            "downloaded": 0, "bytes": 0, "stopped_early": 0, "truncated": 0, "skipped_type": 0, "skipped_size": 0, "skipped_wait": 0,
+            "charset_bom": 0, "charset_header": 0, "charset_meta": 0, "charset_probe": 0
+        }
+        self._skipped_pages = OrderedDict()  # url -> 跳过原因
+        self._download_lock = threading.Lock()
+        # 按查询缓存的句子匹配器
+        self.query_matchers = QueryMatcherCache(self._get_related_terms)
+        # 可选的提取进程池，未启用时在当前进程中执行
+        self.extraction_pool = ExtractionPool(self._extract_key_information_local, self.html_extractor.extract)
     
-    def search(self, query, num_results=30):
+    def search(self, query, num_results=30, timeout=30):
+        """执行搜索并返回结果，相同查询进行中时等待其结果"""
+        results = self.search_flight.do(
+            (normalize_query(query), num_results),
+            lambda: self._search(query, num_results, timeout)
+        )
+        # 调用者会修改结果字典，返回副本
+        return [dict(result) for result in results]
+    
+    def _search(self, query, num_results=30, timeout=30):
         """执行搜索并返回结果，处理可能的编码问题"""
         logger.info(f"执行搜索查询: {query}")
         try:
@@ -72,12 +93,16 @@ class SearchService:
             normalized_query = self._normalize_text(query) if hasattr(self, '_normalize_text') else query
             logger.info(f"规范化后的查询: {normalized_query}")
             
-            # 执行搜索
-            if self.serpapi_key:
-                results = self._search_with_serpapi(normalized_query, num_results)
-            else:
-                # 如果没有SerpAPI密钥，使用备用的搜索方法
-                results = self._search_fallback(normalized_query, num_results)
+            # 本地语料库中有足够多覆盖查询的新鲜网页时，不再请求外部搜索引擎
+            results = self._search_local_corpus(normalized_query, num_results)
+            if results is None:
+                # 执行搜索
+                if self.serpapi_key:
+                    results = self._search_with_serpapi(normalized_query, num_results, timeout)
+                else:
+                    # 如果没有SerpAPI密钥，使用备用的搜索方法
+                    results = self._search_fallback(normalized_query, num_results, timeout)
+                self._remember_titles(results)
             
             # 对结果进行编码处理
             for result in results:
@@ -91,312 +116,291 @@ class SearchService:
             logger.error(f"搜索过程中出错: {str(e)}")
             return []
     
-    def _search_with_serpapi(self, query, num_results=30):
+    def _search_local_corpus(self, query, num_results):
+        """检索本地语料库，结果足以代替外部搜索时返回结果（带网页正文content），否则返回None"""
+        try:
+            results, sufficient = self.local_corpus.search(query, num_results)
+        except Exception as e:
+            logger.error(f"本地语料库检索错误: {str(e)}")
+            return None
+        if not sufficient:
+            return None
+        logger.info(f"本地语料库命中: {query} ({len(results)} 个结果)")
+        for result in results:
+            result["source"] = self._get_domain_name(result["link"])
+            result["source_icon"] = self._get_favicon(result["link"])
+        return results
+    
+    def _remember_titles(self, results):
+        """记录外部搜索结果的标题，网页抓取后随正文写入本地语料库"""
+        with self._download_lock:
+            for result in results:
+                if result.get("link") and result.get("title"):
+                    self._result_titles[result["link"]] = result["title"]
+                    self._result_titles.move_to_end(result["link"])
+            while len(self._result_titles) > 1000:
+                self._result_titles.popitem(last=False)
+    
+    def _add_to_corpus(self, url, content):
+        if not content:
+            return
+        with self._download_lock:
+            title = self._result_titles.get(url)
+        self.local_corpus.add(url, content, title)
+    
+    def _search_with_serpapi(self, query, num_results=30, timeout=30):
         """使用SerpAPI执行Google搜索"""
         try:
-            params = {
-                "engine": "google",
-                "q": query,
-                "api_key": self.serpapi_key,
-                "num": num_results,
-                "hl": "zh-cn"  # 设置语言为中文
-            }
-            
-            search = GoogleSearch(params)
-            results = search.get_dict()
-            
-            if "error" in results:
-                logger.error(f"SerpAPI错误: {results['error']}")
-                return []
-            
-            organic_results = results.get("organic_results", [])
-            
-            search_results = []
-            for result in organic_results[:num_results]:
-                search_results.append({
-                    "title": result.get("title", ""),
-                    "link": result.get("link", ""),
-                    "snippet": result.get("snippet", ""),
-                    "source": self._get_domain_name(result.get("link", "")),
-                    "source_icon": self._get_favicon(result.get("link", ""))
-                })
-            
-            return search_results
+            return self._cached_search("google", "zh-cn", query, num_results,
+                                       lambda: self._request_serpapi(query, num_results, timeout))
         except Exception as e:
             logger.error(f"SerpAPI搜索错误: {str(e)}")
             return []
     
-    def _search_fallback(self, query, num_results=30):
+    def _request_serpapi(self, query, num_results, timeout):
+        """请求SerpAPI，出错时抛出异常（错误结果不进入缓存）"""
+        params = {
+            "engine": "google",
+            "q": query,
+            "api_key": self.serpapi_key,
+            "num": num_results,
+            "hl": "zh-cn"  # 设置语言为中文
+        }
+        
+        # GoogleSearch只用于构造请求，请求本身通过挂载了可取消适配器的会话发出，研究取消时可中断
+        search = GoogleSearch(dict(params, output="json"))
+        url, query_params = search.construct_url()
+        results = self.session.get(url, params=query_params, timeout=timeout).json()
+        
+        if "error" in results:
+            # 查询本身没有结果时SerpAPI也以error返回，视为空结果
+            if "hasn't returned any results" in results["error"]:
+                return []
+            raise RuntimeError(f"SerpAPI错误: {results['error']}")
+        
+        organic_results = results.get("organic_results", [])
+        
+        search_results = []
+        for result in organic_results[:num_results]:
+            search_results.append({
+                "title": result.get("title", ""),
+                "link": result.get("link", ""),
+                "snippet": result.get("snippet", ""),
+                "source": self._get_domain_name(result.get("link", "")),
+                "source_icon": self._get_favicon(result.get("link", ""))
+            })
+        
+        return search_results
+    
+    def _search_fallback(self, query, num_results=30, timeout=30):
         """备用搜索方法（如果没有SerpAPI密钥）"""
         try:
-            # 使用DuckDuckGo API（不需要API密钥）
-            url = f"https://api.duckduckgo.com/?q={query}&format=json"
-            response = requests.get(url)
-            data = response.json()
-            
-            search_results = []
-            for result in data.get("RelatedTopics", [])[:num_results]:
-                if "Text" in result and "FirstURL" in result:
-                    search_results.append({
-                        "title": result["Text"].split(" - ")[0] if " - " in result["Text"] else result["Text"],
-                        "link": result["FirstURL"],
-                        "snippet": result["Text"],
-                        "source": self._get_domain_name(result["FirstURL"]),
-                        "source_icon": self._get_favicon(result["FirstURL"])
-                    })
-            
-            return search_results
+            return self._cached_search("duckduckgo", None, query, num_results,
+                                       lambda: self._request_duckduckgo(query, num_results, timeout))
         except Exception as e:
             logger.error(f"备用搜索错误: {str(e)}")
             return []
     
-    def fetch_content(self, url):
-        """获取网页内容，并处理编码问题"""
+    def _request_duckduckgo(self, query, num_results, timeout):
+        """请求DuckDuckGo API（不需要API密钥），出错时抛出异常"""
+        url = f"https://api.duckduckgo.com/?q={query}&format=json"
+        response = self.session.get(url, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        
+        search_results = []
+        for result in data.get("RelatedTopics", [])[:num_results]:
+            if "Text" in result and "FirstURL" in result:
+                search_results.append({
+                    "title": result["Text"].split(" - ")[0] if " - " in result["Text"] else result["Text"],
+                    "link": result["FirstURL"],
+                    "snippet": result["Text"],
+                    "source": self._get_domain_name(result["FirstURL"]),
+                    "source_icon": self._get_favicon(result["FirstURL"])
+                })
+        
+        return search_results
+    
+    def _cached_search(self, engine, language, query, num_results, request):
+        """先查搜索缓存，未命中时调用request请求搜索引擎并缓存结果（包括空结果）"""
+        key = self.search_cache.make_key(engine, query, language, num_results)
+        results = self.search_cache.get(key)
+        if results is not None:
+            logger.info(f"搜索缓存命中: {query} ({engine}, {len(results)} 个结果)")
+            return results
+        
+        results = request()
+        self.search_cache.put(key, engine, query, results)
+        return results
+    
+    def get_cache_stats(self):
+        """各级缓存的命中统计"""
+        return {
+            "search": self.search_cache.stats(),
+            "pages": self.page_cache.stats(),
+            "documents": self.document_cache.stats(),
+            "corpus": self.local_corpus.stats(),
+            "single_flight": {"search": self.search_flight.stats(), "fetch": self.fetch_flight.stats()}
+        }
+    
+    def fetch_content(self, url, timeout=10):
+        """获取网页内容，相同URL正在抓取时等待其结果"""
+        return self.fetch_flight.do(url, lambda: self._fetch_content(url, timeout))
+    
+    def _fetch_content(self, url, timeout=10):
+        """获取网页内容，并处理编码问题
+        
+        新鲜期内的页面直接使用缓存；过期的页面发送条件请求，未修改（304）时沿用缓存的正文
+        """
         try:
+            cached = self.page_cache.lookup(url)
+            if cached and cached["fresh"]:
+                logger.info(f"网页缓存命中: {url}")
+                return cached["content"]
+            
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
                 'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
                 'Accept-Encoding': 'gzip, deflate, br'
             }
-            response = self.session.get(url, timeout=10, headers=headers)
-            response.raise_for_status()
-            
-            # 尝试检测内容编码
-            if response.encoding.lower() == 'iso-8859-1':
-                # 可能是误判，尝试用更可能的编码
-                encodings = ['utf-8', 'gbk', 'gb2312', 'gb18030', 'big5']
-                for enc in encodings:
-                    try:
-                        text = response.content.decode(enc)
-                        response.encoding = enc
-                        logger.info(f"成功使用 {enc} 编码解析网页内容")
-                        break
-                    except UnicodeDecodeError:
-                        continue
-            
-            # 使用正确的编码和HTML解析器
-            soup = BeautifulSoup(response.content, 'html.parser', from_encoding=response.encoding)
-            
-            # 尝试提取主要内容
-            main_content = ""
-            
-            # 尝试查找文章主体
-            for tag in ["article", "main", ".content", "#content", ".post", ".article"]:
-                content = soup.select(tag)
-                if content:
-                    main_content = content[0].get_text(separator=' ', strip=True)
-                    break
-            
-            # 如果未找到主要内容，则使用所有段落
-            if not main_content:
-                paragraphs = soup.find_all('p')
-                main_content = ' '.join([p.get_text(strip=True) for p in paragraphs])
-            
-            # 如果依然没有内容，则使用整个页面文本
-            if not main_content:
-                main_content = soup.get_text(separator=' ', strip=True)
-            
-            # 截断过长的内容
-            if len(main_content) > 10000:
-                main_content = main_content[:10000] + "..."
+            if cached:
+                headers.update(self.page_cache.conditional_headers(cached))
+            # 主机被限流或排队过久时，等待不超过本次抓取的超时时间
+            with self.fetch_scheduler.lease(url, max_wait=timeout) as host:
+                response = host.get(url, timeout=timeout, headers=headers, stream=True)
+                try:
+                    if cached and response.status_code == 304:
+                        logger.info(f"网页未修改，使用缓存内容: {url}")
+                        self.page_cache.revalidated(url, response.headers)
+                        self._add_to_corpus(url, cached["content"])
+                        return cached["content"]
+                    response.raise_for_status()
+                    
+                    # 下载前根据响应头跳过非网页内容和过大的页面
+                    skip_reason = self._precheck_response(response)
+                    if skip_reason:
+                        self._record_skipped_page(url, skip_reason)
+                        return ""
+                    
+                    main_content = self._read_main_content(url, response, timeout)
+                finally:
+                    response.close()
             
+            self.page_cache.store(url, main_content, response.headers)
+            self._add_to_corpus(url, main_content)
             return main_content
+        except FetchWaitTimeout as e:
+            logger.warning(f"放弃抓取网页 {url}: {str(e)}")
+            self._record_skipped_page(url, "wait")
+            return ""
         except Exception as e:
             logger.error(f"获取网页内容失败 {url}: {str(e)}")
             return ""
     
-    def extract_key_information(self, text, query):
-        """从文本中提取与查询相关的关键信息 - 改进版本"""
-        try:
-            # 如果文本为空或过短，直接返回none，避免处理空内容
-            if not text or len(text) < 50:
-                logger.warning(f"提取内容过短或为空: {len(text) if text else 0} 字符")
-                return None
-            
-            # 预清理文本，去除多余空格和几个常见的无用文本模式
-            text = re.sub(r'\s+', ' ', text)  # 将多个空白字符替换为单个空格
-            text = re.sub(r'(\d+)\s*?[.:]\s*', r'\1. ', text)  # 修复数字列表格式
-            text = re.sub(r'\.(\w)', r'. \1', text)  # 修复句点后缺少空格的问题
-                
-            # 将文本分割成句子 - 使用多种策略
-            sentences = []
-            
-            # 先尝试使用NLTK
-            try:
-                ensure_nltk_data()  # 确保数据已下载
-                sentences = sent_tokenize(text)
-            except Exception as e:
-                logger.warning(f"NLTK分句失败: {str(e)}")
-            
-            # 如果NLTK失败，使用基于规则的方法
-            if not sentences:
-                logger.info("使用自定义分句规则")
-                # 第一阶段：先分割段落
-                paragraphs = re.split(r'\n\s*\n|\r\n\s*\r\n', text)
-                
-                # 第二阶段：对每个段落分割句子
-                for paragraph in paragraphs:
-                    # 使用多种分割符号分割句子
-                    para_sentences = re.split(r'(?<=[.!?])\s+|(?<=[.!?])(?=[A-Z])|\.\s|\!\s|\?\s|\;\s|\n\s*\-|\n\s*\*|\n\s*\d+\.', paragraph)
-                    # 清理并添加有效句子
-                    for s in para_sentences:
-                        s = s.strip()
-                        if s and len(s) > 15:  # 只加入足够长度的有效句子
-                            sentences.append(s)
-            
-            # 如果仍然没有成功提取句子，使用最原始的分隔符
-            if not sentences and text:
-                logger.warning("使用基本分隔符分句")
-                sentences = [s.strip() for s in re.split(r'[.!?]', text) if s.strip() and len(s.strip()) > 15]
-            
-            # 最后手段：如果还是无法分句，就按固定长度分割
-            if not sentences and len(text) > 100:
-                logger.warning("按固定长度分割文本")
-                chunk_size = 150
-                sentences = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-            
-            # 如果仍然没有句子，返回原始文本的一部分
-            if not sentences and text:
-                return text[:500] + "..." if len(text) > 500 else text
-            elif not sentences:
-                logger.warning("无法提取有效的句子")
-                return None
-            
-            # 拆分查询关键词和短语 - 改进版算法
-            query_parts = query.lower()
-            # 处理多种分隔符
-            query_parts = re.sub(r'[-_\s]', ' ', query_parts)
-            
-            # 优化关键词提取算法
-            # 1. 按空格划分
-            space_split_keywords = [word for word in query_parts.split() if len(word) > 2]
-            
-            # 2. 尝试提取短语(连续2-3个词)
-            phrases = []
-            words = query_parts.split()
-            if len(words) >= 2:
-                for i in range(len(words)-1):
-                    if len(words[i]) > 1 and len(words[i+1]) > 1:  # 确保不是单个字符
-                        phrases.append(f"{words[i]} {words[i+1]}")
-                        
-            # 3. 特殊处理中文查询
-            chinese_keywords = []
-            if re.search(r'[\u4e00-\u9fa5]', query_parts):
-                # 中文文本处理：提取连续2-4个字符
-                for i in range(len(query_parts)):
-                    if i+2 <= len(query_parts):
-                        chunk2 = query_parts[i:i+2]
-                        if re.search(r'[\u4e00-\u9fa5]', chunk2) and len(chunk2.strip()) > 1:
-                            chinese_keywords.append(chunk2)
-                    if i+3 <= len(query_parts):
-                        chunk3 = query_parts[i:i+3]
-                        if re.search(r'[\u4e00-\u9fa5]', chunk3) and len(chunk3.strip()) > 2:
-                            chinese_keywords.append(chunk3)
-                    if i+4 <= len(query_parts):
-                        chunk4 = query_parts[i:i+4]
-                        if re.search(r'[\u4e00-\u9fa5]', chunk4) and len(chunk4.strip()) > 3:
-                            chinese_keywords.append(chunk4)
-            
-            # 组合所有提取的关键词
-            query_keywords = space_split_keywords + phrases + chinese_keywords
-            
-            # 去除重复并过滤常见的无意义词
-            stopwords = ['研究', '问题', '什么', '怎么', '为什么', '如何', '分析']
-            query_keywords = [k for k in query_keywords if k.strip() and k.strip().lower() not in stopwords]
-            query_keywords = list(set(query_keywords))  # 去除重复
-            
-            # 如果终究没有有效关键词，使用原始查询
-            if not query_keywords:
-                query_keywords = [query_parts]
-            
-            # 寻找相关句子并打分 - 全新增强版匹配算法
-            relevant_sentences = []
-            
-            # 记录已处理的句子以避免重复
-            processed_sentences = set()
-            
-            for sentence in sentences:
-                # 跳过过短或重复的句子
-                if len(sentence) < 20 or sentence in processed_sentences:
+    def _precheck_response(self, response):
+        """检查Content-Type和Content-Length，返回跳过原因，可以下载时返回None"""
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type and content_type not in TEXT_CONTENT_TYPES:
+            return f"type:{content_type}"
+        content_length = response.headers.get("Content-Length", "")
+        if content_length.isdigit() and int(content_length) > self.max_page_bytes:
+            return f"size:{content_length}"
+        return None
+    
+    def _read_main_content(self, url, response, timeout):
+        """流式下载并增量提取正文：收集到足够正文、超过字节上限或超时即停止下载
+        
+        启用提取进程池时缓存下载的网页，在工作进程中解析，此时不能提前结束下载
+        """
+        if self.extraction_pool.enabled:
+            extractor = BufferedSession(self.extraction_pool.extract_text)
+        else:
+            extractor = self.html_extractor.session()
+        decoder = None
+        head = b""
+        received = 0
+        started = time.time()
+        reason = None
+        for chunk in response.iter_content(chunk_size=16 * 1024):
+            received += len(chunk)
+            if decoder is None:
+                # 编码根据开头的数据确定一次，之后整个文档只增量解码一遍；分块或解压后的首个数据块
+                # 可能很短，先累积到足以检查<meta>声明和统计探测的长度
+                head += chunk
+                if (len(head) < PROBE_BYTES and received < self.max_page_bytes
+                        and time.time() - started <= timeout):
                     continue
-                    
-                processed_sentences.add(sentence)
-                sentence_lower = sentence.lower()
-                
-                # 定义不同类型的匹配得分
-                exact_match_score = 0     # 精确匹配得分
-                partial_match_score = 0    # 部分匹配得分
-                semantic_match_score = 0    # 语义相关得分
-                data_value_score = 0       # 数据价值得分
-                
-                # 1. 精确关键词匹配
-                for keyword in query_keywords:
-                    # 完全匹配：关键词出现在句子中
-                    if keyword in sentence_lower:
-                        exact_match_score += 3
-                        # 给中文短语更高权重
-                        if re.search(r'[\u4e00-\u9fa5]', keyword) and len(keyword) >= 3:
-                            exact_match_score += 1
-                    # 部分匹配：句子包含关键词的一部分
-                    elif len(keyword) > 4 and any(part in sentence_lower for part in keyword.split() if len(part) > 3):
-                        partial_match_score += 1
-                    # 语义相关匹配：检测句子中是否有相关词汇
-                    elif any(related in sentence_lower for related in self._get_related_terms(keyword)):
-                        semantic_match_score += 0.5
-                
-                # 2. 数据质量权重
-                # 检测百分比数据
-                percentage_matches = re.findall(r'\d+(?:\.\d+)?\s*(?:%|百分之|百分比)', sentence_lower)
-                if percentage_matches:
-                    data_value_score += len(percentage_matches) * 2
-                
-                # 检测年份和日期信息
-                date_matches = re.findall(r'\d{4}(?:\s*[年-]\s*\d{1,2}\s*[月日]?)', sentence_lower)
-                if date_matches:
-                    data_value_score += len(date_matches)
-                
-                # 检测数字列表和表格数据
-                if re.search(r'\d+\.\s*\w+|\([1-9]\)|[1-9]\)\s*\w+|\u7b2c[\u4e00-\u4e94六七八九十]|\u8868\s*\d+', sentence_lower):
-                    data_value_score += 1
-                
-                # 重要信息标记
-                info_markers = ['\u91cd要', '\u7279别', '\u503c得\u6ce8意', '\u503c得关注', '\u4e3b要', '\u5173键', 'important', 'critical', 'significant']
-                if any(marker in sentence_lower for marker in info_markers):
-                    data_value_score += 1
-                
-                # 3. 计算加权总分
-                total_score = exact_match_score * 1.5 + partial_match_score + semantic_match_score + data_value_score * 1.2
-                
-                # 只收集超过阈值的句子
-                if total_score > 0.5:  # 降低阈值增加可能的匹配数量
-                    relevant_sentences.append((sentence, total_score))
-            
-            # 按相关性排序
-            relevant_sentences.sort(key=lambda x: x[1], reverse=True)
-            
-            # 如果找到了相关句子，只保留句子内容
-            relevant_sentences = [s[0] for s in relevant_sentences]
-            
-            # 如果没有找到相关句子，使用前几个句子
-            if not relevant_sentences and sentences:
-                relevant_sentences = sentences[:5]
-                logger.info("未找到精确匹配，使用首句摘要")
-            
-            # 将相关句子组合成段落
-            if relevant_sentences:
-                # 限制返回的句子数量，避免过多
-                if len(relevant_sentences) > 8:
-                    relevant_sentences = relevant_sentences[:8]
-                    
-                key_info = " ".join(relevant_sentences)
-                # 限制长度
-                if len(key_info) > 1000:
-                    key_info = key_info[:1000] + "..."
-                return key_info
-            else:
-                logger.warning("未找到任何相关信息")
-                return None
+                decoder = self._charset_decoder(head, response)
+                chunk = head
+            if extractor.feed_text(decoder.decode(chunk)):
+                reason = "stopped_early"
+                break
+            if received >= self.max_page_bytes:
+                reason = "truncated"
+                logger.warning(f"网页超过 {self.max_page_bytes} 字节，只解析已下载部分: {url}")
+                break
+            if time.time() - started > timeout:
+                reason = "truncated"
+                logger.warning(f"网页下载超时，只解析已下载部分: {url}")
+                break
+        else:
+            if decoder is None and head:
+                # 整个网页不足探测长度
+                decoder = self._charset_decoder(head, response)
+                extractor.feed_text(decoder.decode(head))
+            if decoder is not None:
+                extractor.feed_text(decoder.decode(b"", final=True))
+        
+        with self._download_lock:
+            self.download_stats["downloaded"] += 1
+            self.download_stats["bytes"] += received
+            if reason:
+                self.download_stats[reason] += 1
+        return extractor.result()
+    
+    def _charset_decoder(self, head, response):
+        """根据网页开头的字节和响应头创建增量解码器"""
+        encoding, source = sniff_charset(head, response.headers.get("Content-Type"))
+        with self._download_lock:
+            self.download_stats[f"charset_{source}"] += 1
+        return codecs.getincrementaldecoder(encoding)(errors="replace")
+    
+    def _record_skipped_page(self, url, reason):
+        """记录因类型、大小或主机排队超时被跳过的网页"""
+        logger.warning(f"跳过网页 {url}: {reason}")
+        kind = {"type": "skipped_type", "size": "skipped_size"}.get(reason.split(":")[0], "skipped_wait")
+        with self._download_lock:
+            self.download_stats[kind] += 1
+            self._skipped_pages[url] = reason
+            while len(self._skipped_pages) > 1000:
+                self._skipped_pages.popitem(last=False)
+    
+    def get_skip_reason(self, url):
+        """网页因类型、大小或主机排队超时被跳过的原因，未被跳过时返回None"""
+        with self._download_lock:
+            return self._skipped_pages.get(url)
+    
+    def get_download_stats(self):
+        with self._download_lock:
+            return dict(self.download_stats, max_page_bytes=self.max_page_bytes, extractor=self.html_extractor.name)
+    
+    def extract_key_information(self, text, query, url=None):
+        """从文本中提取与查询相关的关键信息 - 改进版本
+        
+        url用于区分不同网页的预处理缓存，同一网页在不同查询下只预处理一次；
+        启用提取进程池时在工作进程中执行
+        """
+        return self.extraction_pool.extract_key_information_batch([(text, query, url)])[0]
+    
+    def extract_key_information_batch(self, items):
+        """批量提取关键信息，items为 [(文本, 查询, url)]，结果按顺序返回"""
+        return self.extraction_pool.extract_key_information_batch(items)
+    
+    def _extract_key_information_local(self, text, query, url=None):
+        """在当前进程中提取关键信息"""
+        try:
+            return extract_key_information(text, query, self.document_cache, self.query_matchers, url)
         except Exception as e:
             logger.error(f"提取关键信息失败: {str(e)}")
             return None  # 返回None而不是错误消息
@@ -410,47 +414,7 @@ class SearchService:
         Returns:
             列表: 语义相关词汇
         """
-        # 通用关键词映射表
-        common_term_map = {
-            # 中文常见语义相关映射
-            '研究': ['分析', '调查', '考察', '实验', '探索', '测试'],
-            '市场': ['销售', '行业', '商业', '销量', '客户', '消费', '商品', '产品'],
-            '分析': ['评估', '解析', '比较', '评价', '考量', '研判'],
-            '数据': ['统计', '信息', '资料', '表格', '指标', '百分比', '占比'],
-            '趋势': ['发展', '走势', '变化', '潮流', '未来', '增长', '上涨', '下降'],
-            '竞争': ['对手', '对比', '比较', '竞争者', '竞争格局', '竞争对手'],
-            '问题': ['困难', '障碍', '挑战', '瓶颈', '矛盾'],
-            '发展': ['增长', '扩大', '提升', '改进', '进步'],
-            '成本': ['支出', '费用', '价格', '花费', '投入'],
-            '效益': ['回报', '利润', '收益', '效益率', '效益率', '投资回报'],
-            # 英文常见语义相关映射
-            'market': ['industry', 'business', 'commercial', 'customers', 'consumers', 'sales'],
-            'analysis': ['evaluation', 'assessment', 'research', 'study', 'investigation', 'examination'],
-            'data': ['statistics', 'figures', 'information', 'metrics', 'indicators', 'percentage'],
-            'trend': ['development', 'movement', 'change', 'growth', 'future', 'evolution'],
-            'cost': ['expense', 'expenditure', 'payment', 'investment', 'price'],
-            'benefit': ['profit', 'return', 'gain', 'advantage', 'roi', 'return on investment']
-        }
-
-        # 首先检查关键词是否直接在映射表中
-        if keyword.lower() in common_term_map:
-            return common_term_map[keyword.lower()]
-            
-        # 检查关键词是否是召回映射表中某个词的一部分
-        related_terms = []
-        for base_word, terms in common_term_map.items():
-            # 检查关键词是否包含在任何基础词中
-            if base_word in keyword or keyword in base_word:
-                related_terms.extend(terms)
-            # 如果关键词在任何相关词中
-            for term in terms:
-                if term in keyword or keyword in term:
-                    # 添加基础词及其他相关词
-                    related_terms.append(base_word)
-                    related_terms.extend([t for t in terms if t != term])
-        
-        # 返回去重后的结果
-        return list(set(related_terms))
+        return get_related_terms(keyword)
     
     def _normalize_text(self, text):
         """清理和规范化文本，修复编码问题和特殊字符"""
@@ -0,0 +1,116 @@
+import os
+import re
+import logging
+import threading
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 不作为句子结尾的英文缩写（小写，不含末尾句点）
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "cf", "al",
+    "inc", "ltd", "co", "corp", "dept", "univ", "no", "vol", "fig", "figs", "eq", "p", "pp",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    "u.s", "u.k", "u.n", "e.u", "a.m", "p.m", "approx", "est", "min", "max"
+}
+
+# 句末标点及其后紧跟的右引号、右括号
+_BOUNDARY = re.compile(r'(?:[。！？；]+|[.!?]+)[”’"\'）)\]】」』]*')
+_CJK = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+_TOKEN_BEFORE = re.compile(r'([A-Za-z0-9.]+)$')
+
+class RuleSentenceSplitter:
+    """基于规则的中英文混合分句
+
+    中文句末标点（。！？；）直接断句；英文句末标点（.!?）后面必须是空白、文本结尾或中文字符，
+    并排除常见缩写、人名首字母、小数和列表序号。
+    """
+
+    name = "rule"
+
+    def split(self, text):
+        sentences = []
+        start = 0
+        for match in _BOUNDARY.finditer(text):
+            end = match.end()
+            if match.group()[0] in ".!?":
+                following = text[end:end + 1]
+                if following and not following.isspace() and not _CJK.match(following):
+                    continue
+                if match.group()[0] == "." and self._is_abbreviation(text, start, match.start(), end):
+                    continue
+            sentence = text[start:end].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = end
+        tail = text[start:].strip()
+        if tail:
+            sentences.append(tail)
+        return sentences
+
+    def _is_abbreviation(self, text, start, dot, end):
+        """句点前的词是否使句点不构成句末"""
+        if text[dot:end].count(".") > 1:
+            return False  # 省略号
+        token = _TOKEN_BEFORE.search(text, start, dot)
+        if not token:
+            return False
+        word = token.group(1)
+        if word.lower() in ABBREVIATIONS:
+            return True
+        if len(word) == 1 and word.isupper():
+            return True  # 人名首字母，如 J. Smith
+        if word.isdigit():
+            rest = text[end:].lstrip()
+            # 被拆开的小数（如 "3. 14"），或位于句首的列表序号（如 "2. 方法"）
+            if rest[:1].isdigit() or not text[start:token.start()].strip():
+                return True
+        return False
+
+class NltkSentenceSplitter:
+    """NLTK punkt分句：首次使用时从本地目录加载模型，不会联网下载；不可用时退回规则分句"""
+
+    name = "nltk"
+
+    def __init__(self, data_path=None, fallback=None):
+        self.data_path = data_path or os.getenv("NLTK_DATA_PATH", os.path.join(os.getcwd(), "nltk_data"))
+        self.fallback = fallback or RuleSentenceSplitter()
+        self._tokenize = None
+        self._unavailable = False
+        self._lock = threading.Lock()
+
+    def split(self, text):
+        tokenize = self._load()
+        if tokenize is None:
+            return self.fallback.split(text)
+        return tokenize(text)
+
+    def _load(self):
+        if self._tokenize is not None or self._unavailable:
+            return self._tokenize
+        with self._lock:
+            if self._tokenize is None and not self._unavailable:
+                try:
+                    import nltk
+                    from nltk.tokenize import sent_tokenize
+                    if self.data_path not in nltk.data.path:
+                        nltk.data.path.append(self.data_path)
+                    sent_tokenize("Test. Test.")  # 触发模型加载，找不到时抛出LookupError
+                    self._tokenize = sent_tokenize
+                    logger.info(f"已加载NLTK punkt分句模型，数据目录: {self.data_path}")
+                except Exception as e:
+                    self._unavailable = True
+                    logger.warning(f"无法加载NLTK punkt模型（请将punkt放入 {self.data_path}），使用规则分句: {type(e).__name__}")
+        return self._tokenize
+
+SPLITTERS = {cls.name: cls for cls in (RuleSentenceSplitter, NltkSentenceSplitter)}
+
+DEFAULT_SPLITTER = "rule"
+
+def get_sentence_splitter(name=None):
+    """按名称（默认读取SENTENCE_SPLITTER）创建分句器"""
+    name = (name or os.getenv("SENTENCE_SPLITTER", DEFAULT_SPLITTER)).lower()
+    if name not in SPLITTERS:
+        logger.warning(f"未知的分句器 {name}，使用 {DEFAULT_SPLITTER}")
+        name = DEFAULT_SPLITTER
+    return SPLITTERS[name]()
@@ -3,6 +3,7 @@ import time
 import json
 import logging
 import requests
+from app.services.cancellation import CancellableHTTPAdapter, check_cancelled, current_token
 from typing import List, Optional, Dict, Any, Union
 
 # 设置日志
@@ -28,8 +29,8 @@ class SiliconFlowService:
         self.session.verify = False
         # 设置更长的超时时间
         self.timeout = 60  # 增加到60秒
-        # 设置连接池选项
-        self.session.mount('https://', requests.adapters.HTTPAdapter(
+        # 设置连接池选项，研究取消时可中断进行中的请求
+        self.session.mount('https://', CancellableHTTPAdapter(
             max_retries=3,
             pool_connections=10,
             pool_maxsize=10
@@ -42,6 +43,8 @@ class SiliconFlowService:
         retry_delay = 2  # 初始重试延迟2秒，随后指数增加
         
         for attempt in range(max_retries):
+            # 研究已取消时不再发起请求
+            check_cancelled()
             try:
                 logger.info(f"向硅基流动API发送请求 (尝试 {attempt+1}/{max_retries})")
                 logger.info(f"请求URL: {url}")
@@ -60,7 +63,7 @@ class SiliconFlowService:
                     if attempt < max_retries - 1:
                         wait_time = retry_delay * (attempt + 1)
                         logger.info(f"等待 {wait_time} 秒后重试...")
-                        time.sleep(wait_time)
+                        self._wait_before_retry(wait_time)
                         retry_delay *= 1.5  # 更平缓的指数退避策略
                         continue
                         
@@ -72,7 +75,7 @@ class SiliconFlowService:
                     if attempt < max_retries - 1:
                         wait_time = retry_delay * (attempt + 1)
                         logger.info(f"等待 {wait_time} 秒后重试...")
-                        time.sleep(wait_time)
+                        self._wait_before_retry(wait_time)
                         retry_delay *= 1.5
                         continue
                     else:
@@ -88,7 +91,7 @@ class SiliconFlowService:
                 if attempt < max_retries - 1:
                     wait_time = retry_delay * (attempt + 1)
                     logger.info(f"超时后等待 {wait_time} 秒再重试...")
-                    time.sleep(wait_time)
+                    self._wait_before_retry(wait_time)
                     retry_delay *= 1.5
                 else:
                     logger.error(f"硅基流动API请求超时，已达到最大重试次数，放弃尝试")
@@ -99,7 +102,7 @@ class SiliconFlowService:
                 if attempt < max_retries - 1:
                     wait_time = retry_delay * (attempt + 1)
                     logger.info(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
+                    self._wait_before_retry(wait_time)
                     retry_delay *= 1.5
                 else:
                     logger.error(f"硅基流动API请求失败，已达到最大重试次数")
@@ -110,12 +113,22 @@ class SiliconFlowService:
                 if attempt < max_retries - 1:
                     wait_time = retry_delay * (attempt + 1)
                     logger.info(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
+                    self._wait_before_retry(wait_time)
                     retry_delay *= 1.5
                 else:
                     logger.error(f"硅基流动API请求失败，已达到最大重试次数: {str(e)}")
                     raise
     
+    def _wait_before_retry(self, wait_time):
+        """重试前等待；研究被取消时立即放弃重试"""
+        check_cancelled()
+        token = current_token()
+        if token is not None:
+            token.wait(wait_time)
+            check_cancelled()
+        else:
+            time.sleep(wait_time)
+    
     def _make_api_request(self, endpoint, payload, max_retries=3, timeout=120):
         """发送API请求到硅基流动，包含重试机制"""
         url = f"{self.api_base_url}/{endpoint}"
@@ -0,0 +1,98 @@
+import os
+import time
+import logging
+import threading
+from app.services.cancellation import ResearchCancelled, check_cancelled, current_token
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """一次进行中的请求"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.token = current_token()  # 发起请求的研究过程的取消令牌
+
+    @property
+    def aborted(self):
+        """发起者的研究已取消，请求可能被中途中断，结果不可用"""
+        return isinstance(self.error, ResearchCancelled) or (self.token is not None and self.token.cancelled)
+
+class SingleFlight:
+    """相同键的并发请求合并为一次
+
+    某个键的请求进行中时，后来的调用者等待其结果而不是重复请求；
+    请求完成后结果在result_ttl秒内继续复用（空结果不保留）。
+    """
+
+    def __init__(self, name, result_ttl=None, max_entries=None):
+        self.name = name
+        self.result_ttl = result_ttl if result_ttl is not None else float(
+            os.getenv(f"SINGLE_FLIGHT_{name.upper()}_TTL", 60))
+        self.max_entries = max_entries or int(os.getenv("SINGLE_FLIGHT_MAX_ENTRIES", 1000))
+        self._lock = threading.Lock()
+        self._calls = {}     # key -> 进行中的_Call
+        self._results = {}   # key -> (过期时间, 结果)
+        self._counters = {"executed": 0, "coalesced": 0, "reused": 0, "retried": 0}
+
+    def do(self, key, fn):
+        """执行fn()，相同键已有进行中的请求或未过期的结果时直接使用"""
+        while True:
+            with self._lock:
+                cached = self._results.get(key)
+                if cached is not None and cached[0] > time.time():
+                    self._counters["reused"] += 1
+                    return cached[1]
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self._counters["executed"] += 1
+                else:
+                    self._counters["coalesced"] += 1
+
+            if leader:
+                return self._execute(key, call, fn)
+
+            # 等待进行中的请求，期间本研究过程被取消时立即退出
+            while not call.done.wait(0.2):
+                check_cancelled()
+            if not call.aborted:
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # 发起者的研究被取消导致请求中断，由当前调用者重新发起
+            with self._lock:
+                self._counters["retried"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._calls), retained=len(self._results))
+
+    def _execute(self, key, call, fn):
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and call.result and not call.aborted and self.result_ttl > 0:
+                    self._results[key] = (time.time() + self.result_ttl, call.result)
+                    self._prune()
+            call.done.set()
+
+    def _prune(self):
+        """清理过期结果，超过条目上限时丢弃最早保存的结果"""
+        if len(self._results) <= self.max_entries:
+            return
+        now = time.time()
+        for key in [key for key, (expires_at, _) in self._results.items() if expires_at <= now]:
+            del self._results[key]
+        while len(self._results) > self.max_entries:
+            del self._results[next(iter(self._results))]
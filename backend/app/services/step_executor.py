@@ -0,0 +1,60 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.services.cancellation import ResearchCancelled
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+class StepExecutor:
+    """研究步骤执行器，使用有界线程池并发执行互不依赖的研究步骤"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or int(os.getenv("RESEARCH_STEP_WORKERS", 3))
+        logger.info(f"初始化研究步骤执行器，并发数: {self.max_workers}")
+
+    def run(self, process, tasks):
+        """并发执行一组研究步骤，所有步骤结束后才返回
+
+        Args:
+            process: 研究过程对象
+            tasks: [(步骤索引, 无参可调用对象)] 列表，按提交顺序进入线程池
+
+        Raises:
+            任一步骤抛出的第一个异常（在全部步骤结束后重新抛出，保持与串行执行一致的错误语义），
+            研究被取消时抛出ResearchCancelled
+        """
+        if not tasks:
+            return
+
+        workers = max(1, min(self.max_workers, len(tasks)))
+        logger.info(f"研究过程 {process.process_id} 并发执行 {len(tasks)} 个步骤，线程数: {workers}")
+
+        first_error = None
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"research-{process.process_id}") as executor:
+            futures = {executor.submit(self._run_task, process, task): step_index for step_index, task in tasks}
+            for future in as_completed(futures):
+                step_index = futures[future]
+                try:
+                    future.result()
+                except ResearchCancelled as e:
+                    first_error = e
+                except Exception as e:
+                    logger.error(f"执行研究步骤 {step_index+1} 时出错: {str(e)}")
+                    if first_error is None:
+                        first_error = e
+
+        if first_error is not None:
+            raise first_error
+
+    def _run_task(self, process, task):
+        """在研究过程的取消令牌下执行步骤，已取消时直接跳过"""
+        token = process.cancel_token
+        if token.cancelled:
+            token.record_skip("steps")
+            return
+        with token.activate():
+            task()
+
+# 创建全局执行器实例
+step_executor = StepExecutor()
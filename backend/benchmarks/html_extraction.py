@@ -0,0 +1,92 @@
+"""正文提取后端基准测试
+
+在fixtures/html下的网页样本（或--corpus指定的目录）上比较各后端的吞吐量，
+以及提取结果与参考实现（soup）的文本重合度。
+
+用法（在backend目录下）：
+    python benchmarks/html_extraction.py [--rounds 20] [--corpus DIR] [--backends soup,lxml,streaming]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.html_extractors import EXTRACTORS, available_extractors
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+
+def load_corpus(path):
+    """读取目录下的所有.html/.htm文件，返回 [(文件名, HTML文本)]"""
+    pages = []
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith((".html", ".htm")):
+            with open(os.path.join(path, name), "rb") as f:
+                pages.append((name, f.read().decode("utf-8", errors="replace")))
+    return pages
+
+def _shingles(text, size=3):
+    text = " ".join(text.split())
+    return {text[i:i + size] for i in range(max(1, len(text) - size + 1))} if text else set()
+
+def overlap(reference, candidate):
+    """两段文本的字符三元组Jaccard相似度，两者都为空时为1"""
+    a, b = _shingles(reference), _shingles(candidate)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def run(pages, backends, rounds):
+    reference = EXTRACTORS["soup"]()
+    expected = {name: reference.extract(html_text) for name, html_text in pages}
+    total_bytes = sum(len(html_text.encode("utf-8")) for _, html_text in pages)
+
+    rows = []
+    for backend in backends:
+        extractor = EXTRACTORS[backend]()
+        outputs = {name: extractor.extract(html_text) for name, html_text in pages}
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for _, html_text in pages:
+                extractor.extract(html_text)
+        elapsed = time.perf_counter() - started
+        scores = {name: overlap(expected[name], outputs[name]) for name in outputs}
+        rows.append({
+            "backend": backend,
+            "pages_per_sec": len(pages) * rounds / elapsed,
+            "mb_per_sec": total_bytes * rounds / elapsed / 1024 / 1024,
+            "mean_overlap": sum(scores.values()) / len(scores),
+            "min_overlap": min(scores.values()),
+            "scores": scores
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="正文提取后端基准测试")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="网页样本目录")
+    parser.add_argument("--rounds", type=int, default=20, help="每个后端遍历样本的轮数")
+    parser.add_argument("--backends", default=",".join(available_extractors()), help="逗号分隔的后端名称")
+    parser.add_argument("--verbose", action="store_true", help="输出每个样本的重合度")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        sys.exit(f"样本目录中没有HTML文件: {args.corpus}")
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    unknown = [name for name in backends if name not in available_extractors()]
+    if unknown:
+        sys.exit(f"后端不可用: {', '.join(unknown)}（可用: {', '.join(available_extractors())}）")
+
+    rows = run(pages, backends, args.rounds)
+    print(f"样本: {len(pages)} 个网页, 轮数: {args.rounds}, 参考实现: soup")
+    print(f"{'后端':<12}{'网页/秒':>12}{'MB/秒':>10}{'平均重合度':>12}{'最低重合度':>12}")
+    for row in rows:
+        print(f"{row['backend']:<12}{row['pages_per_sec']:>12.1f}{row['mb_per_sec']:>10.2f}"
+              f"{row['mean_overlap']:>12.3f}{row['min_overlap']:>12.3f}")
+        if args.verbose:
+            for name, score in sorted(row["scores"].items()):
+                print(f"    {name:<32}{score:.3f}")
+
+if __name__ == "__main__":
+    main()
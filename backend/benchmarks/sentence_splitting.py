@@ -0,0 +1,94 @@
+"""分句器基准测试
+
+把fixtures/html下的网页样本提取为正文后，比较规则分句与NLTK punkt分句的吞吐量和
+断句位置的一致程度（以punkt为参考的F1）。punkt模型需预先放在NLTK_DATA_PATH
+（默认为backend/nltk_data）下，找不到时只测试规则分句。
+
+用法（在backend目录下）：
+    python benchmarks/sentence_splitting.py [--rounds 50] [--corpus DIR]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.html_extractors import get_extractor
+from app.services.sentence_splitter import RuleSentenceSplitter, NltkSentenceSplitter
+from html_extraction import DEFAULT_CORPUS, load_corpus
+
+def prepare_texts(pages):
+    """提取正文并做与extract_key_information相同的预清理"""
+    extractor = get_extractor("streaming")
+    texts = []
+    for _, html_text in pages:
+        text = re.sub(r'\s+', ' ', extractor.extract(html_text))
+        text = re.sub(r'(\d+)\s*?[.:]\s*', r'\1. ', text)
+        text = re.sub(r'\.(\w)', r'. \1', text)
+        texts.append(text)
+    return texts
+
+def boundaries(text, sentences):
+    """句子在原文中的结束位置"""
+    ends, position = set(), 0
+    for sentence in sentences:
+        index = text.find(sentence, position)
+        if index < 0:
+            continue
+        position = index + len(sentence)
+        ends.add(position)
+    return ends
+
+def agreement(texts, reference, candidate):
+    """以参考分句器的断句位置为准，计算候选分句器的F1"""
+    matched = predicted = expected = 0
+    for text in texts:
+        ref = boundaries(text, reference.split(text))
+        cand = boundaries(text, candidate.split(text))
+        matched += len(ref & cand)
+        predicted += len(cand)
+        expected += len(ref)
+    precision = matched / predicted if predicted else 0.0
+    recall = matched / expected if expected else 0.0
+    return 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+def measure(splitter, texts, rounds):
+    sentences = sum(len(splitter.split(text)) for text in texts)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            splitter.split(text)
+    elapsed = time.perf_counter() - started
+    chars = sum(len(text) for text in texts) * rounds
+    return sentences, chars / elapsed / 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="分句器基准测试")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="网页样本目录")
+    parser.add_argument("--rounds", type=int, default=50, help="遍历样本的轮数")
+    args = parser.parse_args()
+
+    texts = prepare_texts(load_corpus(args.corpus))
+    if not texts:
+        sys.exit(f"样本目录中没有HTML文件: {args.corpus}")
+
+    rule = RuleSentenceSplitter()
+    nltk = NltkSentenceSplitter()
+    splitters = [rule]
+    if nltk._load() is not None:
+        splitters.append(nltk)
+    else:
+        print(f"未找到NLTK punkt模型（{nltk.data_path}），只测试规则分句")
+
+    print(f"样本: {len(texts)} 段正文, 共 {sum(len(t) for t in texts)} 字符, 轮数: {args.rounds}")
+    print(f"{'分句器':<10}{'句子数':>10}{'千字符/秒':>14}")
+    for splitter in splitters:
+        sentences, speed = measure(splitter, texts, args.rounds)
+        print(f"{splitter.name:<10}{sentences:>10}{speed:>14.1f}")
+    if len(splitters) > 1:
+        print(f"规则分句与punkt断句位置一致度(F1): {agreement(texts, nltk, rule):.3f}")
+
+if __name__ == "__main__":
+    main()
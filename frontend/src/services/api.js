@@ -90,10 +90,31 @@ export const startResearch = async (topic, requirements = '详细全面') => {
   }
 };
 
+// 每个研究过程最近一次的完整状态，轮询时只请求该版本之后的变化
+const researchStatusCache = {};
+
+// 将增量响应合并到缓存的完整状态中
+const mergeResearchStatus = (previous, delta) => {
+  const { changed_steps: changedSteps, since, ...fields } = delta;
+  const merged = { ...previous, ...fields };
+  if (changedSteps) {
+    const steps = [...(previous.research_steps || [])];
+    Object.entries(changedSteps).forEach(([index, step]) => {
+      steps[Number(index)] = step;
+    });
+    merged.research_steps = steps;
+  }
+  return merged;
+};
+
 // 获取研究进度
 export const getResearchStatus = async (processId) => {
   try {
-    const { data } = await apiClient.get(`/research/status/${processId}`);
+    const cached = researchStatusCache[processId];
+    const params = cached ? { since: cached.version } : {};
+    const { data: response } = await apiClient.get(`/research/status/${processId}`, { params });
+    const data = cached && response.since !== undefined ? mergeResearchStatus(cached, response) : response;
+    researchStatusCache[processId] = data;
     console.log('获取研究状态:', data);
     return data;
   } catch (error) {